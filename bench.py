@@ -0,0 +1,412 @@
+#!/usr/bin/env python3
+
+import argparse
+import contextlib
+import io
+import json
+import platform
+import random
+import sys
+import tempfile
+import time
+import tracemalloc
+from pathlib import Path
+
+import numpy as np
+
+import gen
+import process
+import scrape
+import selector
+
+# Arguments for generate_task / generate_task_batch per task category
+CATEGORIES = {
+    'regular': {'skewness_ratio': None, 'combined_elasticity': False},
+    'iso': {'skewness_ratio': 1.0, 'combined_elasticity': False},
+    'comb': {'skewness_ratio': None, 'combined_elasticity': True},
+    'comb-constrained': {'skewness_ratio': None, 'combined_elasticity': True, 'constrained': True},
+}
+
+# Platforms for --platforms and the suite: processors -> (min CPUs, max CPUs per core type,
+# target accepted tasks/s of the seeded batch engine on one core)
+PLATFORMS = {
+    64: (2, 8, 2000),
+    512: (2, 64, 8000),
+    1024: (2, 128, 8000),
+    2048: (2, 256, 8000),
+    4096: (2, 512, 8000),
+}
+
+# Mode ratios for --mode-ratios, from 4 to 1000 modes per task
+MODE_RATIOS = [0.25, 0.1, 0.05, 0.02, 0.01, 0.005, 0.001]
+
+# Fine mode ratios for --platforms and the suite, on every platform from 512 processors up:
+# 100 modes per task (still accepted on the largest platforms) and 1000 (accepted nowhere,
+# so only the mode checks are measured), and the seeded candidates each case draws
+FINE_MODE_RATIOS = [0.01, 0.001]
+FINE_MODE_CANDIDATES = 2048
+
+# Peak bytes numpy may allocate for one 256-candidate batch at a fine mode ratio on any of
+# PLATFORMS; --mode-ratios and --platforms flag the cases above it
+MODE_MEMORY_LIMIT = 256 << 20
+
+# Per-task quantities compared between the scalar and batch generators
+METRICS = ['period', 'span_a', 'span_b', 'min_work_a', 'max_work_b',
+           'min_cpus_a', 'max_cpus_a', 'min_cpus_b', 'max_cpus_b', 'elasticity']
+
+def run_scalar(num_tasks, mode_ratio, category):
+    """Generate num_tasks accepted tasks one candidate at a time."""
+    tasks = []
+    attempts = 0
+    start = time.perf_counter()
+    while len(tasks) < num_tasks:
+        task = gen.generate_task(mode_ratio, **CATEGORIES[category])
+        attempts += 1
+        if task is not None:
+            tasks.append(task)
+    return tasks, attempts, time.perf_counter() - start
+
+def run_batch(num_tasks, mode_ratio, category, batch_size):
+    """Generate num_tasks accepted tasks with the vectorized batch engine."""
+    tasks = []
+    attempts = 0
+    start = time.perf_counter()
+    while len(tasks) < num_tasks:
+        tasks.extend(gen.generate_task_batch(batch_size, mode_ratio, **CATEGORIES[category]))
+        attempts += batch_size
+    return tasks[:num_tasks], attempts, time.perf_counter() - start
+
+def ks_statistic(x, y):
+    """Two-sample Kolmogorov-Smirnov distance between two samples."""
+    x = np.sort(np.asarray(x, dtype=float))
+    y = np.sort(np.asarray(y, dtype=float))
+    points = np.concatenate([x, y])
+    cdf_x = np.searchsorted(x, points, side='right') / len(x)
+    cdf_y = np.searchsorted(y, points, side='right') / len(y)
+    return float(np.max(np.abs(cdf_x - cdf_y)))
+
+def compare_generators(num_tasks, mode_ratio, batch_size, category):
+    """Benchmark both paths for a category and compare their output distributions."""
+    scalar_tasks, scalar_attempts, scalar_time = run_scalar(num_tasks, mode_ratio, category)
+    batch_tasks, batch_attempts, batch_time = run_batch(num_tasks, mode_ratio, category, batch_size)
+
+    print(f"\n=== {category} ({num_tasks} tasks) ===")
+    print(f"scalar: {num_tasks / scalar_time:10.1f} tasks/s, {scalar_attempts / num_tasks:8.1f} attempts/task")
+    print(f"batch:  {num_tasks / batch_time:10.1f} tasks/s, {batch_attempts / num_tasks:8.1f} attempts/task")
+    print(f"speedup: {scalar_time / batch_time:.1f}x")
+
+    # 1% critical value of the two-sample KS test for equal sample sizes
+    critical = 1.63 * np.sqrt(2 / num_tasks)
+    print(f"\n{'metric':<12}{'scalar mean':>14}{'batch mean':>14}{'KS D':>8}  (critical {critical:.3f})")
+    for metric in METRICS:
+        x = [getattr(task, metric) for task in scalar_tasks]
+        y = [getattr(task, metric) for task in batch_tasks]
+        distance = ks_statistic(x, y)
+        flag = '' if distance < critical else '  <-- differs'
+        print(f"{metric:<12}{np.mean(x):14.3f}{np.mean(y):14.3f}{distance:8.3f}{flag}")
+
+    x = [len(task.modes) for task in scalar_tasks]
+    y = [len(task.modes) for task in batch_tasks]
+    print(f"{'modes':<12}{np.mean(x):14.3f}{np.mean(y):14.3f}{ks_statistic(x, y):8.3f}")
+
+def timed(function, repeat):
+    """Best wall time of repeat calls, with the result of the last one; prints inside are discarded"""
+    best = float('inf')
+    for _ in range(repeat):
+        with contextlib.redirect_stdout(io.StringIO()):
+            start = time.perf_counter()
+            result = function()
+            best = min(best, time.perf_counter() - start)
+    return best, result
+
+def bench_generate_task(category, candidates, seed):
+    """Draw a fixed number of seeded candidates; each category gets its own stream."""
+    rng = np.random.default_rng([seed, sorted(CATEGORIES).index(category)])
+    isofunctional = CATEGORIES[category]['skewness_ratio'] == 1.0
+    return sum(gen.generate_task(0.25, rng=rng, isofunctional=isofunctional, **CATEGORIES[category]) is not None
+               for _ in range(candidates))
+
+def bench_platform(processors, num_tasks, seed):
+    """Seeded batch generation of num_tasks regular tasks on one of PLATFORMS; the previous platform is restored."""
+    min_cpus, max_cpus, _ = PLATFORMS[processors]
+    previous = gen.platform()
+    gen.configure_platform(processors, min_cpus, max_cpus)
+    try:
+        return sum(1 for _ in gen.iter_tasks(num_tasks, 0.25, batch_size=32, seed=seed, keep_segments=False))
+    finally:
+        gen.configure_platform(*previous)
+
+def bench_fine_modes(processors, mode_ratio, seed):
+    """Accepted tasks of FINE_MODE_CANDIDATES seeded candidates on one of PLATFORMS; the previous platform is restored."""
+    min_cpus, max_cpus, _ = PLATFORMS[processors]
+    previous = gen.platform()
+    gen.configure_platform(processors, min_cpus, max_cpus)
+    try:
+        rng = np.random.default_rng(seed)
+        return sum(len(gen.generate_task_batch(256, mode_ratio, rng=rng, keep_segments=False))
+                   for _ in range(FINE_MODE_CANDIDATES // 256))
+    finally:
+        gen.configure_platform(*previous)
+
+def peak_batch_memory(processors, mode_ratio, seed):
+    """Peak bytes traced while drawing one seeded 256-candidate batch on one of PLATFORMS; the previous platform is restored."""
+    min_cpus, max_cpus, _ = PLATFORMS[processors]
+    previous = gen.platform()
+    gen.configure_platform(processors, min_cpus, max_cpus)
+    tracemalloc.start()
+    try:
+        gen.generate_task_batch(256, mode_ratio, rng=np.random.default_rng(seed), keep_segments=False)
+        return tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+        gen.configure_platform(*previous)
+
+def bench_generate_task_set(num_tasks, seed, directory):
+    """generate_task_set end to end, YAML file included."""
+    return len(gen.generate_task_set(num_tasks, 0.25, None, str(Path(directory) / 'set.yaml'), seed=seed))
+
+def bench_selector(pool_files, seed):
+    """Load the YAML pools and draw a 16-task set from them, as selector.main does."""
+    pools = [selector.load_task_blocks(file_path) for file_path in pool_files]
+    random.seed(seed)
+    for blocks in pools:
+        selector.select_random_tasks(blocks, 4)
+    return sum(map(len, pools))
+
+def write_synthetic_logs(directory, num_files, lines_per_file, seed):
+    """Scheduler-like stderr logs: mostly chatter, with loss and error lines mixed in."""
+    rng = random.Random(seed)
+    error = "Error: System is not schedulable in any configuration with specified constraints. Not updating modes."
+    chatter = "Selected mode 3 for task 7: work {sec: 0, nsec: 174013873} span {sec: 0, nsec: 62009148}\n"
+    for i in range(num_files):
+        lines = []
+        for _ in range(lines_per_file):
+            draw = rng.random()
+            if draw < 0.01:
+                lines.append(f"Total Loss from Mode Change: {rng.uniform(0, 500):.6f}\n")
+            elif draw < 0.015:
+                lines.append(error + "\n")
+            else:
+                lines.append(chatter)
+        Path(directory, f"run{i}_stderr_{'ie'[i % 2]}_.log").write_text(''.join(lines))
+
+def run_suite(repeat, seed):
+    """
+    Run every benchmark with fixed seeds and inputs. Returns name -> seconds
+    (best of repeat), items processed and the unit they are counted in.
+    """
+    results = {}
+
+    def record(name, seconds, items, unit):
+        results[name] = {'seconds': seconds, 'items': items, 'unit': unit, 'rate': items / seconds}
+        print(f"{name:<28}{seconds * 1000:10.1f} ms{items / seconds:14.1f} {unit}/s")
+
+    for category in ('regular', 'iso', 'comb'):
+        seconds, _ = timed(lambda: bench_generate_task(category, 2000, seed), repeat)
+        record(f"generate_task/{category}", seconds, 2000, 'candidates')
+
+    for processors in PLATFORMS:
+        seconds, accepted = timed(lambda: bench_platform(processors, 2000, seed), repeat)
+        record(f"platform/{processors}", seconds, accepted, 'tasks')
+
+    for processors in PLATFORMS:
+        if processors < 512:
+            continue
+        for mode_ratio in FINE_MODE_RATIOS:
+            seconds, _ = timed(lambda: bench_fine_modes(processors, mode_ratio, seed), repeat)
+            record(f"platform/{processors}/modes{round(1 / mode_ratio)}", seconds, FINE_MODE_CANDIDATES, 'candidates')
+
+    with tempfile.TemporaryDirectory() as directory:
+        seconds, accepted = timed(lambda: bench_generate_task_set(64, seed, directory), repeat)
+        record('generate_task_set/yaml', seconds, accepted, 'tasks')
+
+    pool_files = [Path(__file__).resolve().parent / file_path for file_path in sorted(set(selector.POOL_FILES.values()))]
+    if all(file_path.exists() for file_path in pool_files):
+        seconds, blocks = timed(lambda: bench_selector(pool_files, seed), repeat)
+        record('selector/load_and_sample', seconds, blocks, 'blocks')
+    else:
+        print(f"{'selector/load_and_sample':<28} skipped: pools missing from 3000s/")
+
+    with tempfile.TemporaryDirectory() as directory:
+        log_dir = Path(directory, 'logs')
+        log_dir.mkdir()
+        write_synthetic_logs(log_dir, 8, 50000, seed)
+        log_files = sorted(log_dir.iterdir())
+        megabytes = sum(path.stat().st_size for path in log_files) / 1e6
+
+        seconds, _ = timed(lambda: [scrape.parse_loss_values(path) for path in log_files], repeat)
+        record('scrape/parse_loss_values', seconds, megabytes, 'MB')
+
+        value_dir = Path(directory, 'values')
+        with contextlib.redirect_stdout(io.StringIO()):
+            scrape.process_directory(log_dir, value_dir, workers=1)
+        lines = sum(len(path.read_text().splitlines()) for path in value_dir.iterdir())
+
+        seconds, _ = timed(lambda: process.process_directory(value_dir, use_cache=False), repeat)
+        record('process/process_directory', seconds, lines, 'lines')
+
+        seconds, _ = timed(lambda: process.process_logs(log_dir, workers=1), repeat)
+        record('process/process_logs', seconds, megabytes, 'MB')
+
+    return results
+
+def platform_main(args):
+    """
+    --platforms: accepted tasks/s per platform size against the PLATFORMS
+    targets, then candidates/s, accepted tasks and the peak memory of one
+    batch at each of FINE_MODE_RATIOS from 512 processors up
+    """
+    print(f"{'processors':>10}{'CPUs/type':>12}{'batch tasks/s':>15}{'scalar tasks/s':>16}{'target':>9}")
+    for processors, (min_cpus, max_cpus, target) in PLATFORMS.items():
+        seconds, accepted = timed(lambda: bench_platform(processors, args.tasks, args.seed), args.repeat)
+
+        previous = gen.platform()
+        gen.configure_platform(processors, min_cpus, max_cpus)
+        try:
+            np.random.seed(args.seed)
+            scalar_tasks, _, scalar_time = run_scalar(args.tasks, args.mode_ratio, 'regular')
+        finally:
+            gen.configure_platform(*previous)
+
+        rate = accepted / seconds
+        flag = '' if rate >= target else '  <-- below target'
+        print(f"{processors:>10}{f'{min_cpus}-{max_cpus}':>12}{rate:15.1f}{len(scalar_tasks) / scalar_time:16.1f}{target:9d}{flag}")
+
+    print(f"\n{'processors':>10}{'CPUs/type':>12}{'modes':>7}{'candidates/s':>14}{'accepted':>10}{'peak MB':>9}")
+    for processors, (min_cpus, max_cpus, _) in PLATFORMS.items():
+        if processors < 512:
+            continue
+        for mode_ratio in FINE_MODE_RATIOS:
+            seconds, accepted = timed(lambda: bench_fine_modes(processors, mode_ratio, args.seed), args.repeat)
+            peak = peak_batch_memory(processors, mode_ratio, args.seed)
+            flag = '' if peak <= MODE_MEMORY_LIMIT else '  <-- above memory limit'
+            print(f"{processors:>10}{f'{min_cpus}-{max_cpus}':>12}{round(1 / mode_ratio):>7}{FINE_MODE_CANDIDATES / seconds:14.1f}"
+                  f"{accepted:>10}{peak / 2 ** 20:9.1f}{flag}")
+
+def mode_ratio_main(args):
+    """
+    --mode-ratios: accepted regular tasks per candidate and per second for
+    each platform in PLATFORMS and each of MODE_RATIOS. The modes of a task
+    must have distinct (cpus_a, cpus_b) pairs, so past some mode count a
+    platform accepts nothing; finer ratios are then skipped, as they only add
+    modes. Each cell draws at most args.tasks * 8 candidates or args.seconds.
+
+    The candidates of the finest ratio are checked all the same: the peak
+    memory of one batch of them on each platform must stay under
+    MODE_MEMORY_LIMIT.
+    """
+    print(f"{'processors':>10}{'CPUs/type':>12}{'modes':>7}{'accepted':>10}{'candidates':>12}{'candidates/s':>14}{'tasks/s':>10}")
+    for processors, (min_cpus, max_cpus, _) in PLATFORMS.items():
+        previous = gen.platform()
+        gen.configure_platform(processors, min_cpus, max_cpus)
+        try:
+            for mode_ratio in MODE_RATIOS:
+                rng = np.random.default_rng(args.seed)
+                accepted = attempts = 0
+                start = time.perf_counter()
+                while attempts < args.tasks * 8 and time.perf_counter() - start < args.seconds:
+                    accepted += len(gen.generate_task_batch(256, mode_ratio, rng=rng, keep_segments=False))
+                    attempts += 256
+                seconds = time.perf_counter() - start
+                print(f"{processors:>10}{f'{min_cpus}-{max_cpus}':>12}{round(1 / mode_ratio):>7}{accepted:>10}{attempts:>12}"
+                      f"{attempts / seconds:14.1f}{accepted / seconds:10.1f}")
+                if accepted == 0:
+                    break
+        finally:
+            gen.configure_platform(*previous)
+
+    mode_ratio = MODE_RATIOS[-1]
+    print(f"\n{'processors':>10}{'CPUs/type':>12}{'modes':>7}{'peak MB':>10}{'limit MB':>10}")
+    for processors, (min_cpus, max_cpus, _) in PLATFORMS.items():
+        peak = peak_batch_memory(processors, mode_ratio, args.seed)
+        flag = '' if peak <= MODE_MEMORY_LIMIT else '  <-- above limit'
+        print(f"{processors:>10}{f'{min_cpus}-{max_cpus}':>12}{round(1 / mode_ratio):>7}{peak / 2 ** 20:10.1f}"
+              f"{MODE_MEMORY_LIMIT >> 20:10d}{flag}")
+
+def compare_results(baseline, current, threshold):
+    """Print the time ratio of every benchmark in both runs; returns the names slower by more than threshold."""
+    regressions = []
+    print(f"\n{'benchmark':<28}{'baseline':>12}{'current':>12}{'ratio':>8}")
+    for name in sorted(set(baseline['benchmarks']) & set(current['benchmarks'])):
+        before = baseline['benchmarks'][name]['seconds']
+        after = current['benchmarks'][name]['seconds']
+        ratio = after / before
+        flag = ''
+        if ratio > 1 + threshold:
+            regressions.append(name)
+            flag = '  <-- regression'
+        elif ratio < 1 / (1 + threshold):
+            flag = '  faster'
+        print(f"{name:<28}{before * 1000:10.1f}ms{after * 1000:10.1f}ms{ratio:8.2f}{flag}")
+
+    for name in sorted(set(baseline['benchmarks']) ^ set(current['benchmarks'])):
+        print(f"{name:<28} only in {'baseline' if name in baseline['benchmarks'] else 'current'} run")
+    return regressions
+
+def suite_main(args):
+    """--suite and --compare: machine-readable benchmark runs and regression checks"""
+    if args.compare and len(args.compare) == 2:
+        with open(args.compare[0]) as f:
+            baseline = json.load(f)
+        with open(args.compare[1]) as f:
+            current = json.load(f)
+    else:
+        current = {
+            'meta': {'python': platform.python_version(), 'numpy': np.__version__, 'machine': platform.machine(),
+                     'seed': args.seed, 'repeat': args.repeat},
+            'benchmarks': run_suite(args.repeat, args.seed),
+        }
+        if args.json:
+            with open(args.json, 'w') as f:
+                json.dump(current, f, indent=2)
+            print(f"\nWrote results to {args.json}")
+        if not args.compare:
+            return
+        with open(args.compare[0]) as f:
+            baseline = json.load(f)
+
+    regressions = compare_results(baseline, current, args.threshold)
+    if regressions:
+        print(f"\n{len(regressions)} regression(s) beyond {args.threshold:.0%}: {', '.join(regressions)}")
+        sys.exit(1)
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark the scalar and batch task generators.')
+    parser.add_argument('--tasks', type=int, default=300, help='Accepted tasks to generate per path')
+    parser.add_argument('--mode_ratio', type=float, default=0.25, help='Mode ratio passed to the generator')
+    parser.add_argument('--batch_size', type=int, default=1024, help='Candidates per batch for the batch engine')
+    parser.add_argument('--category', choices=sorted(CATEGORIES) + ['all'], default='all', help='Task category to benchmark')
+    parser.add_argument('--seed', type=int, default=0, help='Seed for the global numpy random state')
+    parser.add_argument('--suite', action='store_true', help='Run the fixed-seed benchmark suite over gen, selector, scrape and process')
+    parser.add_argument('--repeat', type=int, default=3, help='Runs per suite benchmark; the best time is kept')
+    parser.add_argument('--json', type=str, default=None, help='Write the suite results to this JSON file')
+    parser.add_argument('--compare', nargs='+', metavar='JSON', default=None,
+                        help='Compare against a baseline suite JSON (runs the suite), or compare two suite JSON files')
+    parser.add_argument('--threshold', type=float, default=0.10, help='Slowdown ratio above which --compare reports a regression')
+    parser.add_argument('--platforms', action='store_true', help='Measure tasks/s for each platform size in PLATFORMS against its target')
+    parser.add_argument('--mode-ratios', action='store_true',
+                        help='Measure accepted tasks for each platform in PLATFORMS and each mode ratio in MODE_RATIOS')
+    parser.add_argument('--seconds', type=float, default=10.0, help='Time limit per platform and mode ratio for --mode-ratios')
+
+    args = parser.parse_args()
+
+    if args.suite or args.compare:
+        suite_main(args)
+        return
+
+    if args.platforms:
+        platform_main(args)
+        return
+
+    if args.mode_ratios:
+        mode_ratio_main(args)
+        return
+
+    np.random.seed(args.seed)
+
+    categories = sorted(CATEGORIES) if args.category == 'all' else [args.category]
+    for category in categories:
+        compare_generators(args.tasks, args.mode_ratio, args.batch_size, category)
+
+if __name__ == "__main__":
+    main()
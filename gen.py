@@ -1,6 +1,16 @@
 import numpy as np
+import argparse
+import json
 import math
 import sys
+import time
+from collections import Counter, defaultdict, deque
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+
+import instrument
+import serve
+from pool import PoolWriter, SignatureIndex, convert_yaml_pool, iter_yaml_blocks, load_mode_table, mode_table_path, parse_block
 
 #light: 4 - 1
 #normal 4 - 16
@@ -20,23 +30,208 @@ INVERTED_WORK_COMBINED_ELATICITY = True
 
 NUMBER_OF_PROCESSORS = 64
 
+# Accepted tasks per parallel work unit; fixed so output does not depend on the worker count
+PARALLEL_CHUNK_SIZE = 16
+
+# Chunks submitted ahead per worker when streaming, which bounds the tasks held in memory
+PARALLEL_PREFETCH = 4
+
+# Write buffer for streamed YAML output
+YAML_BUFFER_SIZE = 1 << 20
+
+# Candidates drawn to find the CPU tuples targeted task sets can ask for, and the
+# single-task switches per task allowed to bring their shares back to the totals
+TARGET_PROBE_SIZE = 20000
+TARGET_REPAIR_STEPS = 100
+
+# Bytes of working arrays count_mode_pairs may hold at once; larger batches are checked in row chunks
+MODE_CHECK_BYTES = 64 << 20
+
+# Chunks a deduplicating pool build may draw, as a multiple of the chunks num_tasks takes
+DEDUP_MAX_CHUNKS = 100
+
+# Mean of the lognormal(log 5ms, 0.5) segment length, used to size segment blocks
+SEGMENT_MEAN = 5 * math.exp(0.5 ** 2 / 2)
+
+# Task pools built by `gen.py pools`: file name, mode ratio, skewness ratio, combined
+# elasticity, isofunctional and the seed stream the category draws from. selector.py
+# draws its light tasks from the workload pool, so there is no light pool to build.
+POOL_CATEGORIES = {
+    'workload': ('3000-workload-elastic.yaml', 0.25, None, False, False, 0),
+    'comb': ('3000-comb-elastic.yaml', 0.25, None, True, False, 1),
+    'iso': ('3000-isofunctional-elastic.yaml', 0.25, 1.0, False, True, 2),
+}
+
 iso = False
 
+class GenerationStats:
+    """
+    Counters collected while generating tasks: candidates and accepted tasks per
+    task category, the reason every rejected candidate was thrown away, modes
+    dropped for falling outside MIN_ALLOWED_CPUS/MAX_ALLOWED_CPUS, and the time
+    spent in each generation stage.
+    """
+
+    def __init__(self):
+        self.attempts = defaultdict(int)
+        self.accepted = defaultdict(int)
+        self.rejections = defaultdict(Counter)
+        self.skipped_modes = defaultdict(int)
+        self.stage_seconds = defaultdict(float)
+
+    def reject(self, category, reason, count=1):
+        if count:
+            self.rejections[category][reason] += count
+
+    def lap(self, stage, since):
+        """Add the time since `since` to a stage and return the current time"""
+        now = time.perf_counter()
+        self.stage_seconds[stage] += now - since
+        return now
+
+    def merge(self, other):
+        for category, count in other.attempts.items():
+            self.attempts[category] += count
+        for category, count in other.accepted.items():
+            self.accepted[category] += count
+        for category, reasons in other.rejections.items():
+            self.rejections[category].update(reasons)
+        for category, count in other.skipped_modes.items():
+            self.skipped_modes[category] += count
+        for stage, seconds in other.stage_seconds.items():
+            self.stage_seconds[stage] += seconds
+
+    def to_dict(self):
+        categories = {}
+        for category in sorted(self.attempts):
+            attempts = self.attempts[category]
+            accepted = self.accepted[category]
+            categories[category] = {
+                'attempts': attempts,
+                'accepted': accepted,
+                'acceptance_rate': accepted / attempts if attempts else 0.0,
+                'attempts_per_task': attempts / accepted if accepted else None,
+                'rejections': dict(sorted(self.rejections[category].items())),
+                'skipped_modes': self.skipped_modes[category]
+            }
+
+        return {
+            'categories': categories,
+            'stage_seconds': dict(self.stage_seconds)
+        }
+
+    def write_json(self, filename):
+        with open(filename, 'w') as f:
+            json.dump(self.to_dict(), f, indent=2)
+            f.write("\n")
+
+# One record per discrete mode; total work and CPUs are the sums of the A and B columns
+MODE_DTYPE = np.dtype([('period', np.float64), ('work_a', np.float64), ('work_b', np.float64),
+                       ('cpus_a', np.int64), ('cpus_b', np.int64)])
+
+# One record per segment; core is 'a' or 'b'
+SEGMENT_DTYPE = np.dtype([('length', np.float64), ('min_strands', np.int64), ('max_strands', np.int64), ('core', 'U1')])
+
+class ModeTable:
+    """The discrete modes of one task, held in a single MODE_DTYPE structured array"""
+
+    __slots__ = ('data',)
+
+    def __init__(self, data):
+        self.data = data
+
+    @classmethod
+    def from_columns(cls, period, work_a, work_b, cpus_a, cpus_b):
+        data = np.empty(len(period), dtype=MODE_DTYPE)
+        data['period'] = period
+        data['work_a'] = work_a
+        data['work_b'] = work_b
+        data['cpus_a'] = cpus_a
+        data['cpus_b'] = cpus_b
+        return cls(data)
+
+    def __len__(self):
+        return len(self.data)
+
+    period = property(lambda self: self.data['period'])
+    work_a = property(lambda self: self.data['work_a'])
+    work_b = property(lambda self: self.data['work_b'])
+    cpus_a = property(lambda self: self.data['cpus_a'])
+    cpus_b = property(lambda self: self.data['cpus_b'])
+    total_work = property(lambda self: self.data['work_a'] + self.data['work_b'])
+    total_cpus = property(lambda self: self.data['cpus_a'] + self.data['cpus_b'])
+
+class Task:
+    """
+    One generated task. Plain attributes in __slots__ instead of a dict, the
+    modes in a ModeTable, and the segments as a SEGMENT_DTYPE array (or None
+    when the generator was asked not to keep them).
+    """
+
+    __slots__ = ('span_a', 'span_b', 'period', 'min_work_a', 'max_work_a', 'min_work_b', 'max_work_b', 'modes',
+                 'min_cpus_a', 'max_cpus_a', 'min_cpus_b', 'max_cpus_b', 'elasticity', 'skewness_ratio', 'segments')
+
+    def __init__(self, span_a, span_b, period, min_work_a, max_work_a, min_work_b, max_work_b, modes,
+                 min_cpus_a, max_cpus_a, min_cpus_b, max_cpus_b, elasticity, skewness_ratio, segments=None):
+        self.span_a = span_a
+        self.span_b = span_b
+        self.period = period
+        self.min_work_a = min_work_a
+        self.max_work_a = max_work_a
+        self.min_work_b = min_work_b
+        self.max_work_b = max_work_b
+        self.modes = modes
+        self.min_cpus_a = min_cpus_a
+        self.max_cpus_a = max_cpus_a
+        self.min_cpus_b = min_cpus_b
+        self.max_cpus_b = max_cpus_b
+        self.elasticity = elasticity
+        self.skewness_ratio = skewness_ratio
+        self.segments = segments
+
+def platform():
+    """(NUMBER_OF_PROCESSORS, MIN_ALLOWED_CPUS, MAX_ALLOWED_CPUS) of this run"""
+    return NUMBER_OF_PROCESSORS, MIN_ALLOWED_CPUS, MAX_ALLOWED_CPUS
+
+def configure_platform(processors=None, min_cpus=None, max_cpus=None):
+    """
+    Set the platform the tasks are generated for; None keeps a setting. The
+    processor count sets the strands per segment (so the work of a task),
+    and a task is kept when its CPU counts per core type fall within
+    min_cpus to max_cpus. Worker processes get the platform with their jobs.
+    """
+    global NUMBER_OF_PROCESSORS, MIN_ALLOWED_CPUS, MAX_ALLOWED_CPUS
+
+    processors = NUMBER_OF_PROCESSORS if processors is None else processors
+    min_cpus = MIN_ALLOWED_CPUS if min_cpus is None else min_cpus
+    max_cpus = MAX_ALLOWED_CPUS if max_cpus is None else max_cpus
+    if not 1 <= min_cpus <= max_cpus:
+        raise ValueError(f"Need 1 <= min CPUs <= max CPUs, got {min_cpus} and {max_cpus}")
+    if processors < 1:
+        raise ValueError(f"Need at least one processor, got {processors}")
+
+    NUMBER_OF_PROCESSORS, MIN_ALLOWED_CPUS, MAX_ALLOWED_CPUS = processors, min_cpus, max_cpus
+
+def task_category(skewness_ratio, combined_elasticity):
+    """Name of the task category used in GenerationStats"""
+    if combined_elasticity:
+        return 'comb'
+    return 'iso' if skewness_ratio == 1.0 else 'regular'
+
 def generate_discrete_modes(min_val, max_val, mode_ratio):
+    """Evenly spaced work values from the smaller bound up; arrays of bounds give one row per bound"""
 
     num_modes = round(1 / mode_ratio)
-    step = np.abs(max_val - min_val) / (num_modes - 1)
-
-    if min_val > max_val:
-        return [max_val + i * step for i in range(num_modes)]
+    step = np.abs(np.asarray(max_val) - min_val) / (num_modes - 1)
 
-    return [min_val + i * step for i in range(num_modes)]
+    return np.minimum(min_val, max_val)[..., None] + np.arange(num_modes) * step[..., None]
 
 def generate_discrete_periods(min_val, max_val, mode_ratio):
+    """Evenly spaced periods from min_val to max_val; arrays of bounds give one row per bound"""
 
     num_modes = round(1 / mode_ratio)
-    step = (max_val - min_val) / (num_modes - 1)
-    return [min_val + i * step for i in range(num_modes)]
+    step = (np.asarray(max_val) - min_val) / (num_modes - 1)
+    return np.asarray(min_val)[..., None] + np.arange(num_modes) * step[..., None]
 
 def calculate_cpus(work, span, period, skewness_ratio):
 
@@ -83,75 +278,544 @@ def is_valid_cpus(cpus_a, cpus_b, skewness_ratio):
         
     return True
 
-def generate_task(mode_ratio=0.25, skewness_ratio=None, combined_elasticity=False):
+def calculate_cpus_array(work, span, period, skewness_ratio):
+    """Vectorized calculate_cpus; entries that would be None come back as -1"""
+
+    adjusted_period = np.where(skewness_ratio == 1.0, period, period / 2)
+
+    denominator = adjusted_period - span
+    numerator = work - span
+    valid = (denominator > 0) & (numerator >= 0)
+
+    with np.errstate(divide='ignore', invalid='ignore'):
+        cpus = np.ceil(numerator / np.where(valid, denominator, 1))
+
+    return np.where(valid, cpus, -1).astype(np.int64)
+
+def is_valid_cpus_array(cpus_a, cpus_b, skewness_ratio):
+    """Vectorized is_valid_cpus over whole batches of CPU counts"""
+
+    valid_a = (cpus_a >= MIN_ALLOWED_CPUS) & (cpus_a <= MAX_ALLOWED_CPUS)
+    valid_b = (cpus_b >= MIN_ALLOWED_CPUS) & (cpus_b <= MAX_ALLOWED_CPUS)
+
+    return valid_a & (valid_b | (skewness_ratio == 1.0))
+
+def feasible_period_interval(work, span, skewness_ratio, min_cpus=None, max_cpus=None):
+    """
+    Periods for which calculate_cpus(work, span, period, skewness_ratio) lands in
+    [min_cpus, max_cpus] (by default MIN_ALLOWED_CPUS to MAX_ALLOWED_CPUS), as a
+    half-open interval [low, high).
+
+    ceil((work - span) / (adjusted_period - span)) is between MIN and MAX exactly
+    when span + (work - span) / MAX <= adjusted_period < span + (work - span) / (MIN - 1).
+    Works element-wise on arrays, bounds included; an empty interval has low >= high.
+    """
+    min_cpus = MIN_ALLOWED_CPUS if min_cpus is None else min_cpus
+    max_cpus = MAX_ALLOWED_CPUS if max_cpus is None else max_cpus
+    scale = np.where(skewness_ratio == 1.0, 1.0, 2.0)
+    excess = work - span
+
+    low = scale * (span + excess / max_cpus)
+    with np.errstate(divide='ignore'):
+        high = np.where(np.asarray(min_cpus) > 1, scale * (span + excess / (np.asarray(min_cpus) - 1)), np.inf)
+
+    # Zero excess gives zero CPUs whatever the period
+    return low, np.where(excess > 0, high, low)
+
+def sample_constrained_periods(span_a, span_b, min_work_a, max_work_a, min_work_b, max_work_b, skewness, rng):
+    """
+    Draw (period_low, period) for combined-elasticity candidates so the min/max
+    CPU counts already fall within [MIN_ALLOWED_CPUS, MAX_ALLOWED_CPUS].
+
+    period is drawn from its prior (the larger of two uniform(50, 1000) draws,
+    density proportional to period - 50) truncated to the periods where both
+    min CPU counts are valid, span_a + span_b stays between MIN_PERIOD and 0.8 of
+    the period, and some valid period_low exists below it. period_low is then
+    uniform over the part of [50, period] where both max CPU counts are valid,
+    which is its prior conditioned on that constraint.
+
+    Compared with plain rejection sampling, tasks are weighted by the segments
+    drawn rather than by how wide their feasible period windows are: a segment
+    draw that only fits a narrow window is accepted as often as one that fits
+    any period, so the accepted tasks have the same support but lean towards
+    those combinations. Returns the periods and a mask of rows whose windows
+    are non-empty; the other rows get NaN periods, which fail every CPU check.
+    """
+    n = len(span_a)
+
+    min_a_low, min_a_high = feasible_period_interval(min_work_a, span_a, skewness)
+    min_b_low, min_b_high = feasible_period_interval(min_work_b, span_b, skewness)
+    max_a_low, max_a_high = feasible_period_interval(max_work_a, span_a, skewness)
+    max_b_low, max_b_high = feasible_period_interval(max_work_b, span_b, skewness)
+
+    total_span = span_a + span_b
+    low_floor = np.maximum.reduce([np.full(n, 50.0), max_a_low, max_b_low])
+    low_ceiling = np.minimum(max_a_high, max_b_high)
+
+    period_min = np.maximum.reduce([np.full(n, 50.0), min_a_low, min_b_low, total_span / 0.8, low_floor])
+    period_max = np.minimum.reduce([np.full(n, 1000.0), min_a_high, min_b_high, total_span / MIN_PERIOD])
+    feasible = (period_min < period_max) & (low_floor < low_ceiling)
+
+    # Inverse CDF of the (period - 50) density between period_min and period_max
+    lo = np.where(feasible, period_min, 50.0) - 50
+    hi = np.where(feasible, period_max, 1000.0) - 50
+    period = 50 + np.sqrt(lo ** 2 + rng.uniform(0, 1, n) * (hi ** 2 - lo ** 2))
+
+    low_max = np.minimum(low_ceiling, period)
+    feasible &= low_floor < low_max
+    period_low = low_floor + rng.uniform(0, 1, n) * np.where(feasible, low_max - low_floor, 0)
+
+    return np.where(feasible, period_low, np.nan), np.where(feasible, period, np.nan), feasible
+
+def sample_targeted_periods(span_a, span_b, min_work_a, max_work_a, min_work_b, max_work_b, skewness, targets, rng):
+    """
+    Draw periods for regular candidates so their CPU counts hit targets, an
+    (n, 4) array of min_cpus_a, max_cpus_a, min_cpus_b and max_cpus_b per row.
+
+    Each count pins the period to one window of feasible_period_interval; the
+    period is drawn from its prior truncated to the intersection of the four
+    windows, [50, 1000] and the span ratio bounds, as in
+    sample_constrained_periods. Returns the periods and a mask of rows whose
+    windows are non-empty; the other rows get NaN periods.
+    """
+    n = len(span_a)
+    windows = [feasible_period_interval(work, span, skewness, targets[:, column], targets[:, column])
+               for column, (work, span) in enumerate(((min_work_a, span_a), (max_work_a, span_a),
+                                                      (min_work_b, span_b), (max_work_b, span_b)))]
+
+    total_span = span_a + span_b
+    period_min = np.maximum.reduce([np.full(n, 50.0), total_span / 0.8] + [low for low, _ in windows])
+    period_max = np.minimum.reduce([np.full(n, 1000.0), total_span / MIN_PERIOD] + [high for _, high in windows])
+    feasible = period_min < period_max
+
+    # Inverse CDF of the (period - 50) density between period_min and period_max
+    lo = np.where(feasible, period_min, 50.0) - 50
+    hi = np.where(feasible, period_max, 1000.0) - 50
+    period = 50 + np.sqrt(lo ** 2 + rng.uniform(0, 1, n) * (hi ** 2 - lo ** 2))
+
+    return np.where(feasible, period, np.nan), feasible
+
+def calculate_mode_table(min_work_a, max_work_a, min_work_b, max_work_b, span_a, span_b, period_low, period,
+                         skewness, mode_ratio, combined_elasticity):
+    """
+    Discrete modes for a batch of tasks as (rows, modes) columns: period, work_a,
+    work_b, cpus_a, cpus_b and a mask of the modes within MIN/MAX_ALLOWED_CPUS.
+
+    Combined-elasticity modes take the period at the index of the number of
+    modes kept so far, so a skipped mode shifts the periods of the ones after it.
+    """
+    modes_a = generate_discrete_modes(min_work_a, max_work_a, mode_ratio)
+    modes_b = generate_discrete_modes(min_work_b, max_work_b, mode_ratio)
+    col = lambda values: np.asarray(values)[:, None]
+
+    in_range = lambda cpus: (cpus >= MIN_ALLOWED_CPUS) & (cpus <= MAX_ALLOWED_CPUS)
+
+    if not combined_elasticity:
+        mode_periods = np.repeat(col(period), modes_a.shape[1], axis=1)
+        cpus_a = calculate_cpus_array(modes_a, col(span_a), mode_periods, col(skewness))
+        cpus_b = calculate_cpus_array(modes_b, col(span_b), mode_periods, col(skewness))
+        # Like is_valid_cpus, isofunctional (skewness 1.0) tasks only need core A in range
+        return mode_periods, modes_a, modes_b, cpus_a, cpus_b, in_range(cpus_a) & (in_range(cpus_b) | (col(skewness) == 1.0))
+
+    period_table = generate_discrete_periods(period_low, period, mode_ratio)
+    num_rows, num_modes = period_table.shape
+    mode_periods = np.empty_like(period_table)
+    cpus_a = np.empty(modes_a.shape, dtype=np.int64)
+    cpus_b = np.empty(modes_b.shape, dtype=np.int64)
+    mode_ok = np.empty(modes_a.shape, dtype=bool)
+
+    # Each pass evaluates the rest of every row twice, once assuming every mode
+    # from `done` on is kept and once assuming none is. Whichever guess holds
+    # for the first pending mode is exact up to the first mode that breaks it,
+    # so a pass settles a whole run of kept or skipped modes plus the mode that
+    # ends it, and the number of passes follows the runs rather than the modes.
+    rows = np.arange(num_rows)[:, None]
+    offset = np.arange(num_modes)[None, :]
+    done = np.zeros(num_rows, dtype=np.int64)
+    kept = np.zeros(num_rows, dtype=np.int64)
+
+    while (done < num_modes).any():
+        index = done[:, None] + offset
+        pending = index < num_modes
+        index = np.minimum(index, num_modes - 1)
+
+        guesses = []
+        for guess_kept in (kept[:, None] + offset, np.repeat(kept[:, None], num_modes, axis=1)):
+            guess_periods = period_table[rows, np.minimum(guess_kept, num_modes - 1)]
+            guess_a = calculate_cpus_array(modes_a[rows, index], span_a[:, None], guess_periods, skewness[:, None])
+            guess_b = calculate_cpus_array(modes_b[rows, index], span_b[:, None], guess_periods, skewness[:, None])
+            guesses.append((guess_periods, guess_a, guess_b, in_range(guess_a) & in_range(guess_b)))
+
+        # Both guesses agree on the first pending mode, which picks the guess to follow
+        first_kept = guesses[0][3][:, 0]
+        broken = np.where(first_kept[:, None], ~guesses[0][3], guesses[1][3]) | ~pending
+        run = np.where(broken.any(axis=1), np.argmax(broken, axis=1), num_modes - done)
+        settled = pending & (offset <= run[:, None])
+
+        for target, kept_value, skipped_value in zip((mode_periods, cpus_a, cpus_b, mode_ok), guesses[0], guesses[1]):
+            values = np.where(first_kept[:, None], kept_value, skipped_value)
+            target[np.broadcast_to(rows, index.shape)[settled], index[settled]] = values[settled]
+
+        ends_inside = run < num_modes - done
+        kept += np.where(first_kept, run, ends_inside)
+        done = np.minimum(done + run + 1, num_modes)
+
+    return mode_periods, modes_a, modes_b, cpus_a, cpus_b, mode_ok
+
+def isofunctional_mode_cpus(cpus_a, mode_ok):
+    """CPU columns in the layout of create_isofunctional_modes: (a, 0) followed by (0, a)"""
+
+    zeros = np.zeros_like(cpus_a)
+    mirrored_a = np.stack([cpus_a, zeros], axis=2).reshape(len(cpus_a), -1)
+    mirrored_b = np.stack([zeros, cpus_a], axis=2).reshape(len(cpus_a), -1)
+    return mirrored_a, mirrored_b, np.repeat(mode_ok, 2, axis=1)
+
+def count_mode_pairs(cpus_a, cpus_b, mode_ok, count_unsafe=True):
+    """
+    Pairwise mode checks for a batch of tasks without comparing every pair.
+
+    Returns per-row duplicate flags, valid mode counts, unsafe pair counts and
+    whether any mode has cpus_a and cpus_b more than MAX_ALLOWED_DIFFERENCE
+    apart. Duplicates are equal (cpus_a, cpus_b) keys next to each other once
+    each row's keys are sorted. The unsafe pairs of generate_task (cpus_a and
+    cpus_b moving in opposite directions by at least UNSAFE_AMOUNT, counted
+    for modes with cpus_a < cpus_b) come from dominance_counts, and only for
+    rows without duplicates, which are rejected before unsafe pairs matter;
+    the other rows, and every row without count_unsafe, get 0.
+
+    Memory is O(rows * modes) whatever the CPU counts, and rows are checked
+    in chunks that keep the working arrays under MODE_CHECK_BYTES.
+    """
+    rows, num_modes = cpus_a.shape
+    a = np.where(mode_ok, cpus_a, 0).astype(np.int64)
+    b = np.where(mode_ok, cpus_b, 0).astype(np.int64)
+    size = int(max(a.max(initial=0), b.max(initial=0))) + 1
+
+    # Invalid modes get distinct negative keys, so they never match anything
+    keys = np.where(mode_ok, a * size + b, -1 - np.arange(num_modes))
+    keys.sort(axis=1)
+    duplicate = (keys[:, 1:] == keys[:, :-1]).any(axis=1)
+    mode_count = mode_ok.sum(axis=1)
+    too_far = (mode_ok & (np.abs(a - b) > MAX_ALLOWED_DIFFERENCE)).any(axis=1)
+
+    unsafe = np.zeros(rows, dtype=np.int64)
+    if count_unsafe:
+        step = max(1, math.ceil(UNSAFE_AMOUNT))
+        checked = np.flatnonzero(~duplicate & (mode_count > 1))
+        # About a dozen (rows, 2 * modes) int64 arrays are live per chunk
+        chunk = max(1, MODE_CHECK_BYTES // (num_modes * 2 * 8 * 12))
+        for first in range(0, len(checked), chunk):
+            part = checked[first:first + chunk]
+            ok, pa, pb = mode_ok[part], a[part], b[part]
+            # Modes j with a_j <= a_i - step and b_j > b_i, and (negated) with a_j >= a_i + step and b_j < b_i
+            counts = (dominance_counts(pa, pb, ok, pa - step, pb)
+                      + dominance_counts(-pa, size - pb, ok, -pa - step, size - pb))
+            unsafe[part] = (counts * (ok & (pa < pb))).sum(axis=1)
+
+    return duplicate, mode_count, unsafe, too_far
+
+def dominance_counts(x, y, weight, query_x, query_y):
+    """
+    For every query (row, i): the number of points j of the same row, counted
+    only where weight is set, with x_j <= query_x and y_j > query_y. All
+    arguments are (rows, n) arrays; y and query_y are non-negative integers.
+
+    Points and queries are ordered by x, points first on ties, so every
+    point a query counts comes before it. The comparison on y goes one bit at
+    a time: y_j > y_i exactly when, at the highest bit where they differ, y_j
+    has a 1. So for each bit, a query with a 0 there counts the earlier points
+    with a 1 there and the same higher bits. That is a running sum within
+    groups of equal higher bits, taken after a stable sort by group. The cost
+    is O(n log n) per bit of max(y) and the memory O(rows * n).
+    """
+    rows, n = x.shape
+    is_query = np.concatenate([np.zeros((rows, n), dtype=bool), np.ones((rows, n), dtype=bool)], axis=1)
+    order = np.argsort(np.concatenate([x, query_x], axis=1) * 2 + is_query, axis=1, kind='stable')
+    is_query = np.take_along_axis(is_query, order, axis=1)
+    ys = np.take_along_axis(np.concatenate([y, query_y], axis=1), order, axis=1)
+    points = np.take_along_axis(np.concatenate([weight, np.zeros_like(weight)], axis=1), order, axis=1)
+
+    counts = np.zeros((rows, 2 * n), dtype=np.int64)
+    columns = np.arange(2 * n)
+    for bit in range(int(max(ys.max(initial=0), 1)).bit_length()):
+        ones = ((ys >> bit) & 1).astype(bool)
+        group = ys >> (bit + 1)
+        by_group = np.argsort(group, axis=1, kind='stable')
+        grouped = np.take_along_axis(group, by_group, axis=1)
+        added = np.take_along_axis(points & ones, by_group, axis=1).astype(np.int64)
+        total = np.cumsum(added, axis=1)
+
+        # Running sum since the start of each group
+        starts = np.ones((rows, 2 * n), dtype=bool)
+        starts[:, 1:] = grouped[:, 1:] != grouped[:, :-1]
+        first = np.maximum.accumulate(np.where(starts, columns, 0), axis=1)
+        running = total - np.take_along_axis(total - added, first, axis=1)
+
+        asks = np.take_along_axis(is_query & ~ones, by_group, axis=1)
+        np.put_along_axis(counts, by_group, np.take_along_axis(counts, by_group, axis=1) + running * asks, axis=1)
+
+    # Back from x order to query columns
+    result = np.empty_like(counts)
+    np.put_along_axis(result, order, counts, axis=1)
+    return result[:, n:]
+
+def make_segments(lengths, min_strands, max_strands, count_a):
+    """A task's segments as a SEGMENT_DTYPE array; the first count_a run on core type A"""
+    segments = np.empty(len(lengths), dtype=SEGMENT_DTYPE)
+    segments['length'] = lengths
+    segments['min_strands'] = min_strands
+    segments['max_strands'] = max_strands
+    segments['core'] = 'b'
+    segments['core'][:count_a] = 'a'
+    return segments
+
+def generate_task_batch(batch_size, mode_ratio=0.25, skewness_ratio=None, combined_elasticity=False, rng=None, isofunctional=None, stats=None,
+                        constrained=False, keep_segments=True, targets=None):
+    """
+    Draw batch_size candidate tasks at once and return the accepted ones.
+
+    Follows the same distributions and acceptance rules as generate_task, but
+    every stage works on arrays covering the whole batch. Only the rows that
+    survive all checks are turned into task dicts. For regular tasks, targets
+    (batch_size, 4) fixes the min/max CPU counts of each row, see
+    sample_targeted_periods; rows that miss them are rejected.
+    """
+    if targets is not None and (combined_elasticity or skewness_ratio == 1.0):
+        raise ValueError("CPU targets are only supported for regular tasks")
+
+    rng = np.random if rng is None else rng
+    isofunctional = iso if isofunctional is None else isofunctional
+    n = batch_size
+
+    category = task_category(skewness_ratio, combined_elasticity)
+    if stats is not None:
+        stats.attempts[category] += n
+        mark = time.perf_counter()
+
+    chosen_ratio = rng.uniform(MIN_PERIOD, 0.8, n)
+
+    if skewness_ratio is None:
+        skewness = rng.uniform(MIN_PERIOD, 0.8, n)
+    else:
+        skewness = np.full(n, float(skewness_ratio))
+
+    period_low = rng.uniform(50, 1000, n)
+    period = rng.uniform(50, 1000, n)
+    period_low, period = np.minimum(period_low, period), np.maximum(period_low, period)
+
+    target_span = chosen_ratio * period
+    target_span_a = target_span * skewness
+
+    # Over-draw a block of segments per row and cut each row at its target span
+    width = int(target_span.max() / SEGMENT_MEAN * 1.25) + 16
+    lengths = rng.lognormal(mean=np.log(5), sigma=0.5, size=(n, width))
+    ends = np.cumsum(lengths, axis=1)
+    while np.any(ends[:, -1] < target_span):
+        lengths = np.hstack([lengths, rng.lognormal(mean=np.log(5), sigma=0.5, size=(n, width))])
+        ends = np.cumsum(lengths, axis=1)
+
+    counts = np.argmax(ends >= target_span[:, None], axis=1) + 1
+    starts = np.hstack([np.zeros((n, 1)), ends[:, :-1]])
+    in_task = np.arange(lengths.shape[1]) < counts[:, None]
+
+    # A segment is type 'a' while the span before it is still short of target_span_a
+    is_a = in_task & (starts < target_span_a[:, None])
+    is_b = in_task & ~is_a
+
+    mean_strands = 1 + math.sqrt(NUMBER_OF_PROCESSORS)/3
+    min_strands = np.maximum(1, np.rint(rng.lognormal(mean=np.log(mean_strands), sigma=0.3, size=lengths.shape)))
+    max_strands = np.maximum(min_strands + 1, np.rint(rng.lognormal(mean=np.log(mean_strands * 1.5), sigma=0.3, size=lengths.shape)))
+
+    span_a = np.where(is_a, lengths, 0).sum(axis=1)
+    span_b = np.where(is_b, lengths, 0).sum(axis=1)
+    min_work_a = np.where(is_a, lengths * min_strands, 0).sum(axis=1)
+    max_work_a = np.where(is_a, lengths * max_strands, 0).sum(axis=1)
+    min_work_b = np.where(is_b, lengths * min_strands, 0).sum(axis=1)
+    max_work_b = np.where(is_b, lengths * max_strands, 0).sum(axis=1)
+
+    if stats is not None:
+        mark = stats.lap('segments', mark)
+
+    if combined_elasticity:
+        side_b = rng.uniform(0, 1, n) > 0.5
+        inverted = INVERTED_WORK_COMBINED_ELATICITY & (rng.uniform(0, 1, n) > 0.5)
+
+        min_work_a, max_work_a = (np.where(~side_b & inverted, max_work_a, min_work_a),
+                                  np.where(~side_b, min_work_a, max_work_a))
+        min_work_b, max_work_b = (np.where(side_b & inverted, max_work_b, min_work_b),
+                                  np.where(side_b, min_work_b, max_work_b))
+
+    if combined_elasticity and constrained:
+        period_low, period, _ = sample_constrained_periods(span_a, span_b, min_work_a, max_work_a,
+                                                           min_work_b, max_work_b, skewness, rng)
+
+    if targets is not None:
+        period, _ = sample_targeted_periods(span_a, span_b, min_work_a, max_work_a, min_work_b, max_work_b, skewness, targets, rng)
+        period_low = np.minimum(period_low, period)
+
+    elasticity = rng.uniform(0, 1, n)
+
+    max_period = period_low if combined_elasticity else period
+    min_cpus_a = calculate_cpus_array(min_work_a, span_a, period, skewness)
+    max_cpus_a = calculate_cpus_array(max_work_a, span_a, max_period, skewness)
+    min_cpus_b = calculate_cpus_array(min_work_b, span_b, period, skewness)
+    max_cpus_b = calculate_cpus_array(max_work_b, span_b, max_period, skewness)
+
+    valid_min = is_valid_cpus_array(min_cpus_a, min_cpus_b, skewness)
+    valid_max = is_valid_cpus_array(max_cpus_a, max_cpus_b, skewness)
+    on_target = True
+    if targets is not None:
+        # Rounding at a window edge can still move a count by one
+        on_target = (np.stack([min_cpus_a, max_cpus_a, min_cpus_b, max_cpus_b], axis=1) == targets).all(axis=1)
+    rows = np.flatnonzero(valid_min & valid_max & on_target)
+
+    if stats is not None:
+        mark = stats.lap('cpus', mark)
+        stats.reject(category, 'invalid_min_cpus', int(np.count_nonzero(~valid_min)))
+        stats.reject(category, 'invalid_max_cpus', int(np.count_nonzero(valid_min & ~valid_max)))
+        if targets is not None:
+            stats.reject(category, 'off_target_cpus', int(np.count_nonzero(valid_min & valid_max & ~on_target)))
+
+    if len(rows) == 0:
+        return []
+
+    # Discrete modes for the surviving rows, one column per mode
+    mode_periods, modes_a, modes_b, cpus_a, cpus_b, mode_ok = calculate_mode_table(
+        min_work_a[rows], max_work_a[rows], min_work_b[rows], max_work_b[rows], span_a[rows], span_b[rows],
+        period_low[rows], period[rows], skewness[rows], mode_ratio, combined_elasticity)
+
+    if stats is not None:
+        mark = stats.lap('modes', mark)
+        stats.skipped_modes[category] += int(np.count_nonzero(~mode_ok))
+
+    mirrored = skewness_ratio == 1.0 and isofunctional == True
+    if mirrored:
+        duplicate, mode_count, unsafe, too_far = count_mode_pairs(*isofunctional_mode_cpus(cpus_a, mode_ok), combined_elasticity)
+    else:
+        duplicate, mode_count, unsafe, too_far = count_mode_pairs(cpus_a, cpus_b, mode_ok, combined_elasticity)
+
+    keep = ~duplicate
+    if stats is not None:
+        stats.reject(category, 'duplicate_modes', int(np.count_nonzero(duplicate)))
+
+    if combined_elasticity:
+        with np.errstate(divide='ignore', invalid='ignore'):
+            unsafe_average = unsafe / (mode_count * mode_count)
+
+        no_modes = keep & (mode_count == 0)
+        keep &= ~no_modes
+        far = keep & too_far
+        keep &= ~far
+        few_unsafe = keep & (unsafe_average < MIN_UNSAFE_AVERAGE)
+        keep &= ~few_unsafe
+
+        if stats is not None:
+            stats.reject(category, 'no_valid_modes', int(np.count_nonzero(no_modes)))
+            stats.reject(category, 'modes_too_far_apart', int(np.count_nonzero(far)))
+            stats.reject(category, 'too_few_unsafe_modes', int(np.count_nonzero(few_unsafe)))
+
+    if stats is not None:
+        mark = stats.lap('checks', mark)
+        stats.accepted[category] += int(np.count_nonzero(keep))
+
+    tasks = []
+    for k in np.flatnonzero(keep):
+        r = rows[k]
+        ok = mode_ok[k]
+        modes = ModeTable.from_columns(mode_periods[k, ok], modes_a[k, ok], modes_b[k, ok], cpus_a[k, ok], cpus_b[k, ok])
+
+        task_span_b = float(span_b[r])
+        if mirrored:
+            modes = create_isofunctional_modes(modes)
+            task_span_b = float(span_a[r])
+
+        segments = None
+        if keep_segments:
+            count = counts[r]
+            segments = make_segments(lengths[r, :count], min_strands[r, :count], max_strands[r, :count],
+                                     int(is_a[r, :count].sum()))
+
+        tasks.append(Task(float(span_a[r]), task_span_b, float(period[r]),
+                          float(min_work_a[r]), float(max_work_a[r]), float(min_work_b[r]), float(max_work_b[r]), modes,
+                          int(min_cpus_a[r]), int(max_cpus_a[r]), int(min_cpus_b[r]), int(max_cpus_b[r]),
+                          float(elasticity[r]), float(skewness[r]), segments))
+
+    if stats is not None:
+        stats.lap('records', mark)
+
+    return tasks
+
+def generate_task(mode_ratio=0.25, skewness_ratio=None, combined_elasticity=False, rng=None, isofunctional=None, stats=None,
+                  constrained=False, keep_segments=True):
+    # Draw from the global numpy state unless a Generator is handed in
+    rng = np.random if rng is None else rng
+    isofunctional = iso if isofunctional is None else isofunctional
+
+    category = task_category(skewness_ratio, combined_elasticity)
+    if stats is not None:
+        stats.attempts[category] += 1
+        mark = time.perf_counter()
+
     # Constants
     pmax = 1 / (2 * (2 + math.sqrt(2)))
     
     # Generate ratio of span to minimum period
-    chosen_ratio = np.random.uniform(MIN_PERIOD, 0.8)
+    chosen_ratio = rng.uniform(MIN_PERIOD, 0.8)
     
     # Generate skewness ratio (random between 0.2 and 0.8)
     if skewness_ratio is None:
-        skewness_ratio = np.random.uniform(MIN_PERIOD, 0.8)
+        skewness_ratio = rng.uniform(MIN_PERIOD, 0.8)
     
-    # Generate segments until we reach the target span
-    total_span = 0
-    segments = []
-    segment_strands = []
-    segment_types = []  # 'a' or 'b'
-
     # Generate period uniformly between 50ms and 1s
-    period_low = np.random.uniform(50, 1000)
-    period = np.random.uniform(50, 1000)
+    period_low = rng.uniform(50, 1000)
+    period = rng.uniform(50, 1000)
 
     if period_low > period:
         period_low, period = period, period_low
     
     target_span = chosen_ratio * period  # Converting to milliseconds
     target_span_a = target_span * skewness_ratio
-    current_span_a = 0
-    
-    while total_span < target_span:
-        # Generate segment length from log normal distribution with mean 5ms
-        segment_length = np.random.lognormal(mean=np.log(5), sigma=0.5)
-        
-        # Determine if this segment should be type 'a' or 'b'
-        if current_span_a < target_span_a:
-            segment_type = 'a'
-            current_span_a += segment_length
-        else:
-            segment_type = 'b'
-            
-        # Generate number of strands for min and max work
-        m = NUMBER_OF_PROCESSORS
-        mean_strands = 1 + math.sqrt(m)/3
-        min_strands = max(1, round(np.random.lognormal(mean=np.log(mean_strands), sigma=0.3)))
-        max_strands = max(min_strands + 1, round(np.random.lognormal(mean=np.log(mean_strands * 1.5), sigma=0.3)))
-        
-        segments.append(segment_length)
-        segment_strands.append((min_strands, max_strands))
-        segment_types.append(segment_type)
-        total_span += segment_length
+
+    # Generate segment lengths from a log normal distribution with mean 5ms, a
+    # block at a time, until their running total reaches the target span
+    lengths = rng.lognormal(mean=np.log(5), sigma=0.5, size=int(target_span / SEGMENT_MEAN * 1.25) + 16)
+    ends = np.cumsum(lengths)
+    while ends[-1] < target_span:
+        lengths = np.concatenate([lengths, rng.lognormal(mean=np.log(5), sigma=0.5, size=len(lengths))])
+        ends = np.cumsum(lengths)
+
+    count = int(np.searchsorted(ends, target_span)) + 1
+    lengths = lengths[:count]
+
+    # A segment is type 'a' while the span before it is still short of target_span_a
+    count_a = min(count, int(np.searchsorted(ends, target_span_a)) + 1)
+
+    # Generate number of strands for min and max work
+    m = NUMBER_OF_PROCESSORS
+    mean_strands = 1 + math.sqrt(m)/3
+    min_strands = np.maximum(1, np.rint(rng.lognormal(mean=np.log(mean_strands), sigma=0.3, size=count))).astype(np.int64)
+    max_strands = np.maximum(min_strands + 1, np.rint(rng.lognormal(mean=np.log(mean_strands * 1.5), sigma=0.3, size=count))).astype(np.int64)
 
     # Calculate spans for both types
-    span_a = sum(length for length, type_ in zip(segments, segment_types) if type_ == 'a')
-    span_b = sum(length for length, type_ in zip(segments, segment_types) if type_ == 'b')
+    span_a = float(lengths[:count_a].sum())
+    span_b = float(lengths[count_a:].sum())
 
     # Calculate minimum and maximum work for both types
-    min_work_a = sum(length * strands[0] for length, strands, type_ 
-                    in zip(segments, segment_strands, segment_types) if type_ == 'a')
-    max_work_a = sum(length * strands[1] for length, strands, type_ 
-                    in zip(segments, segment_strands, segment_types) if type_ == 'a')
-    min_work_b = sum(length * strands[0] for length, strands, type_ 
-                    in zip(segments, segment_strands, segment_types) if type_ == 'b')
-    max_work_b = sum(length * strands[1] for length, strands, type_ 
-                    in zip(segments, segment_strands, segment_types) if type_ == 'b')
+    min_work = lengths * min_strands
+    max_work = lengths * max_strands
+    min_work_a = float(min_work[:count_a].sum())
+    max_work_a = float(max_work[:count_a].sum())
+    min_work_b = float(min_work[count_a:].sum())
+    max_work_b = float(max_work[count_a:].sum())
+
+    if stats is not None:
+        mark = stats.lap('segments', mark)
 
     #if we want tasks which will be unsafe for evaluation
     if combined_elasticity:
-        if np.random.uniform(0, 1) > 0.5:
+        if rng.uniform(0, 1) > 0.5:
 
-            if INVERTED_WORK_COMBINED_ELATICITY and np.random.uniform(0, 1) > 0.5:
+            if INVERTED_WORK_COMBINED_ELATICITY and rng.uniform(0, 1) > 0.5:
                 temp = min_work_b
                 min_work_b = max_work_b
                 max_work_b = temp
@@ -159,15 +823,21 @@ def generate_task(mode_ratio=0.25, skewness_ratio=None, combined_elasticity=Fals
                 max_work_b = min_work_b
         else:
 
-            if INVERTED_WORK_COMBINED_ELATICITY and np.random.uniform(0, 1) > 0.5:
+            if INVERTED_WORK_COMBINED_ELATICITY and rng.uniform(0, 1) > 0.5:
                 temp = min_work_a
                 min_work_a = max_work_a
                 max_work_a = temp
             else:
                 max_work_a = min_work_a
+
+        # Replace the blind period draws with ones that already meet the CPU bounds
+        if constrained:
+            period_lows, periods, _ = sample_constrained_periods(*np.atleast_1d(span_a, span_b, min_work_a, max_work_a, min_work_b, max_work_b),
+                                                                 skewness_ratio, rng)
+            period_low, period = float(period_lows[0]), float(periods[0])
         
     # Generate elasticity value
-    elasticity = np.random.uniform(0, 1)
+    elasticity = rng.uniform(0, 1)
     
     # Calculate minimum and maximum CPUs needed for both types
     min_cpus_a = calculate_cpus(min_work_a, span_a, period, skewness_ratio)
@@ -175,111 +845,110 @@ def generate_task(mode_ratio=0.25, skewness_ratio=None, combined_elasticity=Fals
     min_cpus_b = calculate_cpus(min_work_b, span_b, period, skewness_ratio)
     max_cpus_b = calculate_cpus(max_work_b, span_b, period_low if combined_elasticity else period, skewness_ratio)
 
+    if stats is not None:
+        mark = stats.lap('cpus', mark)
+
     # Validate all CPU calculations and system constraints
     if not all([is_valid_cpus(min_cpus_a, min_cpus_b, skewness_ratio),
                 is_valid_cpus(max_cpus_a, max_cpus_b, skewness_ratio)]):
+        if stats is not None:
+            if not is_valid_cpus(min_cpus_a, min_cpus_b, skewness_ratio):
+                stats.reject(category, 'invalid_min_cpus')
+            else:
+                stats.reject(category, 'invalid_max_cpus')
         return None
     
-    # Generate modes and validate their CPU requirements
-    modes_a = generate_discrete_modes(min_work_a, max_work_a, mode_ratio)
-    modes_b = generate_discrete_modes(min_work_b, max_work_b, mode_ratio)
-    
-    # Create combined mode information
-    period_real = []
+    # Generate modes and validate their CPU requirements, one array column per mode field
+    mode_periods, modes_a, modes_b, cpus_a, cpus_b, mode_ok = calculate_mode_table(
+        *np.atleast_1d(min_work_a, max_work_a, min_work_b, max_work_b, span_a, span_b, period_low, period, skewness_ratio),
+        mode_ratio, combined_elasticity)
 
-    if combined_elasticity:
-        period_real = generate_discrete_periods(period_low, period, mode_ratio)
+    if stats is not None:
+        stats.skipped_modes[category] += int(np.count_nonzero(~mode_ok))
 
-    mode_info = []
-    for mode_a, mode_b in zip(modes_a, modes_b):
-
-        period_current = period if not combined_elasticity else period_real[len(mode_info)]
-
-        cpus_a = calculate_cpus(mode_a, span_a, period_current, skewness_ratio)
-        cpus_b = calculate_cpus(mode_b, span_b, period_current, skewness_ratio)
-
-        if cpus_a > MAX_ALLOWED_CPUS or cpus_b > MAX_ALLOWED_CPUS or cpus_a < MIN_ALLOWED_CPUS or cpus_b < MIN_ALLOWED_CPUS:
-            continue
-            
-        mode_info.append({
-            'period': period_current,
-            'total_work': mode_a + mode_b,
-            'work_a': mode_a,
-            'work_b': mode_b,
-            'total_cpus': cpus_a + cpus_b,
-            'cpus_a': cpus_a,
-            'cpus_b': cpus_b
-        })
+    ok = mode_ok[0]
+    modes = ModeTable.from_columns(mode_periods[0, ok], modes_a[0, ok], modes_b[0, ok], cpus_a[0, ok], cpus_b[0, ok])
 
     # For skewness ratio of 1.0, create isofunctional modes
-    if skewness_ratio == 1.0 and iso == True:
-        mode_info = create_isofunctional_modes(mode_info, span_a)
+    mirrored = skewness_ratio == 1.0 and isofunctional == True
+    if mirrored:
+        modes = create_isofunctional_modes(modes)
         # Update span_b to match span_a for isofunctional modes
         span_b = span_a
 
-    #if we want tasks which will be unsafe for evaluation
-    too_far = False
-    duplicate = False
-    unsafe_modes = 0
-    for mode in mode_info:
-        for mode2 in mode_info:
-            if ((mode['cpus_a'] > mode2['cpus_a'] and mode['cpus_b'] < mode2['cpus_b']) or (mode['cpus_a'] < mode2['cpus_a'] and mode['cpus_b'] > mode2['cpus_b'])) and ((((np.abs(mode['cpus_a'] - mode2['cpus_a'])) >= UNSAFE_AMOUNT) and ((mode['cpus_a'] - mode['cpus_b']) < 0)) or (((np.abs(mode['cpus_a'] - mode2['cpus_a'])) >= UNSAFE_AMOUNT) and ((mode['cpus_a'] - mode['cpus_b']) < 0))):
-                unsafe_modes += 1
-            if np.abs(mode['cpus_a'] - mode['cpus_b']) > MAX_ALLOWED_DIFFERENCE:
-                too_far = True
-                break
+    if stats is not None:
+        mark = stats.lap('modes', mark)
+
+    # Duplicate (cpus_a, cpus_b) modes and unsafe mode pairs, counted without an all-pairs loop
+    if mirrored:
+        duplicate, mode_count, unsafe_modes, too_far = count_mode_pairs(*isofunctional_mode_cpus(cpus_a, mode_ok), combined_elasticity)
+    else:
+        duplicate, mode_count, unsafe_modes, too_far = count_mode_pairs(cpus_a, cpus_b, mode_ok, combined_elasticity)
 
-    #loop over all the modes and check if there are any duplicates
-    #use a range
-    for i in range(len(mode_info)):
-        for j in range(i+1, len(mode_info)):
-            if mode_info[i]['cpus_a'] == mode_info[j]['cpus_a'] and mode_info[i]['cpus_b'] == mode_info[j]['cpus_b']:
-                return None
+    if duplicate[0]:
+        if stats is not None:
+            stats.lap('checks', mark)
+            stats.reject(category, 'duplicate_modes')
+        return None
+
+    if combined_elasticity and not len(modes):
+        if stats is not None:
+            stats.lap('checks', mark)
+            stats.reject(category, 'no_valid_modes')
+        return None
     
-    if combined_elasticity and (((unsafe_modes / (len(mode_info) * len(mode_info))) < (MIN_UNSAFE_AVERAGE)) or too_far):
+    if combined_elasticity and (((unsafe_modes[0] / (mode_count[0] * mode_count[0])) < (MIN_UNSAFE_AVERAGE)) or too_far[0]):
+        if stats is not None:
+            stats.lap('checks', mark)
+            if too_far[0]:
+                stats.reject(category, 'modes_too_far_apart')
+            else:
+                stats.reject(category, 'too_few_unsafe_modes')
         return None
+
+    if stats is not None:
+        stats.lap('checks', mark)
+        stats.accepted[category] += 1
     
-    return {
-        'span_a': span_a,
-        'span_b': span_b,
-        'period': period,
-        'min_work_a': min_work_a,
-        'max_work_a': max_work_a,
-        'min_work_b': min_work_b,
-        'max_work_b': max_work_b,
-        'mode_info': mode_info,
-        'min_cpus_a': min_cpus_a,
-        'max_cpus_a': max_cpus_a,
-        'min_cpus_b': min_cpus_b,
-        'max_cpus_b': max_cpus_b,
-        'elasticity': elasticity,
-        'skewness_ratio': skewness_ratio,
-        'segments': list(zip(segments, segment_strands, segment_types))
-    }
+    segments = make_segments(lengths, min_strands, max_strands, count_a) if keep_segments else None
 
-def print_yaml_format(task_num, task):
+    return Task(span_a, span_b, period, min_work_a, max_work_a, min_work_b, max_work_b, modes,
+                min_cpus_a, max_cpus_a, min_cpus_b, max_cpus_b, elasticity, skewness_ratio, segments)
+
+def yaml_mode_times(task):
+    """(work, span, gpu_work, gpu_span, period) of each mode in ns, as written to the YAML output"""
     # Convert milliseconds to nanoseconds for the YAML output
     ms_to_ns = 1_000_000
-    
-    print(f"task: {task_num}\n elasticity: {task['elasticity']:.3f}")
-    print("    modes:")
-    
-    for mode in task['mode_info']:
+
+    times = []
+    for period, work_a, work_b, _, _ in task.modes.data.tolist():
         # Convert all times from ms to ns and ensure they're integers
-        work_ns = int(mode['work_a'] * ms_to_ns)
-        gpu_work_ns = int(mode['work_b'] * ms_to_ns)
+        work_ns = int(work_a * ms_to_ns)
+        gpu_work_ns = int(work_b * ms_to_ns)
 
         span_ns = 0
         gpu_span_ns = 0
 
         if work_ns != 0:
-            span_ns = int(task['span_a'] * ms_to_ns)
+            span_ns = int(task.span_a * ms_to_ns)
         
         if gpu_work_ns != 0:
-            gpu_span_ns = int(task['span_b'] * ms_to_ns)
+            gpu_span_ns = int(task.span_b * ms_to_ns)
             
-        period_ns = int(mode['period'] * ms_to_ns)
-        
+        period_ns = int(period * ms_to_ns)
+        times.append((work_ns, span_ns, gpu_work_ns, gpu_span_ns, period_ns))
+
+    return times
+
+def yaml_elasticity(task):
+    """Integer elasticity written to the YAML output"""
+    return int(np.ceil(1/task.elasticity))
+
+def print_yaml_format(task_num, task):
+    print(f"task: {task_num}\n elasticity: {task.elasticity:.3f}")
+    print("    modes:")
+    
+    for work_ns, span_ns, gpu_work_ns, gpu_span_ns, period_ns in yaml_mode_times(task):
         print(f"      - work: {{sec: 0, nsec: {work_ns}}}")
         print(f"        span: {{sec: 0, nsec: {span_ns}}}")
         print(f"        gpu_work: {{sec: 0, nsec: {gpu_work_ns}}}")
@@ -287,29 +956,11 @@ def print_yaml_format(task_num, task):
         print(f"        period: {{sec: 0, nsec: {period_ns}}}")
 
 def write_yaml_format(task_num, task, file):
-    # Convert milliseconds to nanoseconds for the YAML output
-    ms_to_ns = 1_000_000
-
     file.write("  - program:\n      name: prog\n      args: \"0\"\n    elasticity: ")
-    file.write("{}\n".format(int(np.ceil(1/task['elasticity']))))
+    file.write("{}\n".format(yaml_elasticity(task)))
     file.write("    modes:\n")
     
-    for mode in task['mode_info']:
-        # Convert all times from ms to ns and ensure they're integers
-        work_ns = int(mode['work_a'] * ms_to_ns)
-        gpu_work_ns = int(mode['work_b'] * ms_to_ns)
-
-        span_ns = 0
-        gpu_span_ns = 0
-
-        if work_ns != 0:
-            span_ns = int(task['span_a'] * ms_to_ns)
-        
-        if gpu_work_ns != 0:
-            gpu_span_ns = int(task['span_b'] * ms_to_ns)
-            
-        period_ns = int(mode['period'] * ms_to_ns)
-        
+    for work_ns, span_ns, gpu_work_ns, gpu_span_ns, period_ns in yaml_mode_times(task):
         file.write(f"      - work: {{sec: {int(work_ns / 1000000000)}, nsec: {work_ns % 1000000000}}}\n")
         file.write(f"        span: {{sec: {int(span_ns / 1000000000)}, nsec: {span_ns % 1000000000}}}\n")
         file.write(f"        gpu_work: {{sec: {int(gpu_work_ns / 1000000000)}, nsec: {gpu_work_ns % 1000000000}}}\n")
@@ -318,81 +969,205 @@ def write_yaml_format(task_num, task, file):
     
     file.write("\n")  # Add blank line between tasks
 
-def create_isofunctional_modes(original_modes, span_a):
-    mirrored_modes = []
-    for mode in original_modes:
-        # Original mode with work on core A
-        mirrored_modes.append({
-            'period': mode['period'],
-            'total_work': mode['work_a'],
-            'work_a': mode['work_a'],
-            'work_b': 0,
-            'total_cpus': mode['cpus_a'],
-            'cpus_a': mode['cpus_a'],
-            'cpus_b': 0
-        })
-        # Mirrored mode with work on core B
-        mirrored_modes.append({
-            'period': mode['period'],
-            'total_work': mode['work_a'],  # Same total work
-            'work_a': 0,
-            'work_b': mode['work_a'],  # Move work to core B
-            'total_cpus': mode['cpus_a'],  # Same total CPUs
-            'cpus_a': 0,
-            'cpus_b': mode['cpus_a']  # Move CPUs to core B
-        })
-    return mirrored_modes
-
-def generate_task_set(num_tasks, mode_ratio=0.125, skewness_ratio=None, filename=None):
+def write_binary_pool(tasks, filename):
+    """Write tasks as a memory-mapped binary pool (see pool.py) for selector.py --binary"""
+    with PoolWriter(filename) as writer:
+        for task in tasks:
+            writer.add(yaml_elasticity(task), yaml_mode_times(task))
+
+def mode_table_record(task):
+    """
+    Mode table line of a task (see pool.py): its modes sorted by total CPUs,
+    then type A CPUs, for the scheduler's DP. Each entry gives the mode's
+    index in the YAML modes list, its cpus_a, cpus_b and total_cpus, and
+    whether it is dominated: another mode needs no more CPUs of either type
+    and does at least as much work per period (of identical modes, all but
+    the first).
+    """
+    data = task.modes.data
+    cpus_a, cpus_b = data['cpus_a'], data['cpus_b']
+    utilization = (data['work_a'] + data['work_b']) / data['period']
+    index = np.arange(len(data))
+
+    # [j, i]: mode j is at least as good as mode i on every count
+    no_worse = ((cpus_a[:, None] <= cpus_a) & (cpus_b[:, None] <= cpus_b) & (utilization[:, None] >= utilization))
+    same = (cpus_a[:, None] == cpus_a) & (cpus_b[:, None] == cpus_b) & (utilization[:, None] == utilization)
+    dominated = (no_worse & (~same | (index[:, None] < index))).any(axis=0)
+
+    order = np.lexsort((index, cpus_a, cpus_a + cpus_b))
+    modes = [{'mode': i, 'cpus_a': a, 'cpus_b': b, 'total_cpus': a + b, 'dominated': d}
+             for i, a, b, d in zip(order.tolist(), cpus_a[order].tolist(), cpus_b[order].tolist(), dominated[order].tolist())]
+    return json.dumps({'modes': modes})
+
+def write_mode_table(tasks, filename):
+    """Write the mode table line of every task, in task order"""
+    with open(filename, 'w', buffering=YAML_BUFFER_SIZE) as table_file:
+        for task in tasks:
+            table_file.write(mode_table_record(task) + "\n")
+
+def create_isofunctional_modes(original_modes):
+    """Each mode twice: once with its work on core A and once with that work moved to core B"""
+    original = original_modes.data
+    mirrored = np.zeros(2 * len(original), dtype=MODE_DTYPE)
+
+    # Original mode with work on core A
+    mirrored['period'][0::2] = original['period']
+    mirrored['work_a'][0::2] = original['work_a']
+    mirrored['cpus_a'][0::2] = original['cpus_a']
+
+    # Mirrored mode with the same work and CPUs on core B
+    mirrored['period'][1::2] = original['period']
+    mirrored['work_b'][1::2] = original['work_a']
+    mirrored['cpus_b'][1::2] = original['cpus_a']
+
+    return ModeTable(mirrored)
+
+def _generate_chunk(job):
+    """Worker entry point: build one chunk of accepted tasks from its own seed"""
+    (seed_sequence, chunk_size, mode_ratio, skewness_ratio, combined_elasticity, isofunctional, batch_size, max_attempts, collect_stats,
+     constrained, keep_segments, platform_settings) = job
+
+    configure_platform(*platform_settings)
+    rng = np.random.default_rng(seed_sequence)
+    stats = GenerationStats() if collect_stats else None
     tasks = []
-    task_num = 1
     attempts = 0
-    max_attempts = 100000  # Prevent infinite loops
-    
-    while len(tasks) < num_tasks and attempts < max_attempts:
-        task = generate_task(mode_ratio, skewness_ratio)
-        attempts += 1
-        
-        if task is not None:
+
+    while len(tasks) < chunk_size and (max_attempts is None or attempts < max_attempts):
+        if batch_size:
+            tasks.extend(generate_task_batch(batch_size, mode_ratio, skewness_ratio, combined_elasticity, rng, isofunctional, stats, constrained,
+                                             keep_segments))
+            attempts += batch_size
+        else:
+            task = generate_task(mode_ratio, skewness_ratio, combined_elasticity, rng, isofunctional, stats, constrained, keep_segments)
+            attempts += 1
+            if task is not None:
+                tasks.append(task)
+
+    return tasks[:chunk_size], attempts, stats
+
+def iter_task_chunks(num_tasks, mode_ratio=0.25, skewness_ratio=None, combined_elasticity=False, seed=0, workers=None,
+                     batch_size=None, stream=0, max_attempts=100000, collect_stats=False, constrained=False, keep_segments=True):
+    """
+    Yield (tasks, attempts, stats) for each chunk of PARALLEL_CHUNK_SIZE accepted
+    tasks in index order. Chunk i draws from its own Generator seeded with
+    SeedSequence(seed, spawn_key=(stream, i)). With several workers at most
+    PARALLEL_PREFETCH chunks per worker are in flight, so memory stays bounded
+    however many chunks are consumed; closing the generator cancels the rest.
+    """
+    num_chunks = -(-num_tasks // PARALLEL_CHUNK_SIZE)
+    jobs = ((np.random.SeedSequence(seed, spawn_key=(stream, i)), PARALLEL_CHUNK_SIZE, mode_ratio,
+             skewness_ratio, combined_elasticity, iso, batch_size, max_attempts, collect_stats, constrained, keep_segments, platform())
+            for i in range(num_chunks))
+
+    yield from run_chunk_jobs(jobs, workers)
+
+def run_chunk_jobs(jobs, workers=None):
+    """
+    Run _generate_chunk jobs and yield their results in job order, keeping at
+    most PARALLEL_PREFETCH jobs per worker in flight.
+    """
+    if workers is None or workers <= 1:
+        yield from map(_generate_chunk, jobs)
+        return
+
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        in_flight = deque()
+        try:
+            for job in jobs:
+                in_flight.append(executor.submit(_generate_chunk, job))
+                if len(in_flight) >= workers * PARALLEL_PREFETCH:
+                    yield in_flight.popleft().result()
+
+            while in_flight:
+                yield in_flight.popleft().result()
+        finally:
+            for future in in_flight:
+                future.cancel()
+
+def generate_tasks_parallel(num_tasks, mode_ratio=0.25, skewness_ratio=None, combined_elasticity=False,
+                            seed=0, workers=None, batch_size=None, stream=0, max_attempts=100000, stats=None, constrained=False,
+                            keep_segments=True):
+    """
+    Generate num_tasks accepted tasks across a process pool.
+
+    The work is cut into chunks of PARALLEL_CHUNK_SIZE accepted tasks and chunk
+    i draws from its own Generator seeded with SeedSequence(seed, spawn_key=(stream, i)).
+    Chunks are collected in index order, so the result only depends on the seed
+    and stream, never on the worker count or on how the OS schedules workers.
+    Returns the tasks and the number of candidates drawn; per-chunk counters
+    are merged into stats when one is given.
+    """
+    tasks = []
+    attempts = 0
+    for chunk_tasks, chunk_attempts, chunk_stats in iter_task_chunks(num_tasks, mode_ratio, skewness_ratio, combined_elasticity,
+                                                                     seed, workers, batch_size, stream, max_attempts,
+                                                                     stats is not None, constrained, keep_segments):
+        tasks.extend(chunk_tasks)
+        attempts += chunk_attempts
+        if stats is not None:
+            stats.merge(chunk_stats)
+
+    return tasks[:num_tasks], attempts
+
+def iter_tasks(num_tasks, mode_ratio=0.25, skewness_ratio=None, combined_elasticity=False, batch_size=None, workers=None,
+               seed=None, stats=None, constrained=False, stream=0, max_attempts=100000, keep_segments=True):
+    """
+    Yield up to num_tasks accepted tasks one at a time as they are accepted.
+
+    Uses the seeded chunk streams of iter_task_chunks when workers or seed is
+    given and the global numpy state otherwise. Gives up after max_attempts
+    candidates (per chunk on the seeded path); None means never give up.
+    """
+    produced = 0
+
+    if workers or seed is not None:
+        for chunk_tasks, _, chunk_stats in iter_task_chunks(num_tasks, mode_ratio, skewness_ratio, combined_elasticity,
+                                                            seed or 0, workers, batch_size, stream, max_attempts,
+                                                            stats is not None, constrained, keep_segments):
+            if stats is not None:
+                stats.merge(chunk_stats)
+            for task in chunk_tasks[:num_tasks - produced]:
+                produced += 1
+                yield task
+        return
+
+    attempts = 0
+    while produced < num_tasks and (max_attempts is None or attempts < max_attempts):
+        if batch_size:
+            candidates = generate_task_batch(batch_size, mode_ratio, skewness_ratio, combined_elasticity, stats=stats,
+                                             constrained=constrained, keep_segments=keep_segments)
+            attempts += batch_size
+        else:
+            candidates = [generate_task(mode_ratio, skewness_ratio, combined_elasticity, stats=stats, constrained=constrained,
+                                        keep_segments=keep_segments)]
+            attempts += 1
+
+        for task in candidates:
+            if task is None or produced >= num_tasks:
+                continue
+
+            produced += 1
+            yield task
+
+def generate_task_set(num_tasks, mode_ratio=0.125, skewness_ratio=None, filename=None, batch_size=None,
+                      workers=None, seed=None, stats=None, keep_segments=True, verbose=True, report=None):
+    tasks = []
+    task_num = 1
+
+    # Seeded (optionally multi-process) chunks come back in a fixed order
+    for task in iter_tasks(num_tasks, mode_ratio, skewness_ratio, batch_size=batch_size, workers=workers, seed=seed, stats=stats,
+                           keep_segments=keep_segments):
+        if verbose:
             print(f"\nTask {task_num}:")
-            print(f"Skewness Ratio: {task['skewness_ratio']:.2f}")
-            print(f"Span A: {task['span_a']:.2f}ms")
-            print(f"Span B: {task['span_b']:.2f}ms")
-            print(f"Period: {task['period']:.2f}ms")
-            
-            print("\nWork Type A:")
-            print(f"  Min Work: {task['min_work_a']:.2f}ms")
-            print(f"  Max Work: {task['max_work_a']:.2f}ms")
-            print(f"  Min CPUs: {task['min_cpus_a']}")
-            print(f"  Max CPUs: {task['max_cpus_a']}")
-            
-            print("\nWork Type B:")
-            print(f"  Min Work: {task['min_work_b']:.2f}ms")
-            print(f"  Max Work: {task['max_work_b']:.2f}ms")
-            print(f"  Min CPUs: {task['min_cpus_b']}")
-            print(f"  Max CPUs: {task['max_cpus_b']}")
-            
-            print(f"\nElasticity: {task['elasticity']:.3f}")
-            
-            print("\nSegments (length, (min_strands, max_strands), type):")
-            for idx, (length, strands, type_) in enumerate(task['segments'], 1):
-                print(f"  Segment {idx}: {length:.2f}ms, {strands}, Type {type_}")
-            
-            print("\nModes:")
-            for idx, mode in enumerate(task['mode_info'], 1):
-                print(f"  Mode {idx}:")
-                print(f"    Period: {mode['period']:.2f}ms")
-                print(f"    Total Work: {mode['total_work']:.2f}ms")
-                print(f"    Work Type A: {mode['work_a']:.2f}ms")
-                print(f"    Work Type B: {mode['work_b']:.2f}ms")
-                print(f"    Total CPUs: {mode['total_cpus']}")
-                print(f"    CPUs Type A: {mode['cpus_a']}")
-                print(f"    CPUs Type B: {mode['cpus_b']}")
-            
-            tasks.append(task)
-            task_num += 1
+            print_detailed_task_info(task)
+        if report is not None:
+            report.write(task_num, task)
+
+        tasks.append(task)
+        task_num += 1
     
-    if attempts >= max_attempts:
+    if len(tasks) < num_tasks:
         print("\nWarning: Reached maximum attempts to generate valid tasks. Some tasks may be missing.")
 
     # Add the new YAML-style output
@@ -403,24 +1178,141 @@ def generate_task_set(num_tasks, mode_ratio=0.125, skewness_ratio=None, filename
     else:
         print("\n=== YAML Format Output ===")
 
-    yaml_file_handle = open(filename, 'w') if filename else None
-    for idx, task in enumerate(tasks, 1):
+    if stats is not None:
+        mark = time.perf_counter()
 
-        if filename == None:
+    if filename:
+        with open(filename, 'w') as yaml_file_handle:
+            for idx, task in enumerate(tasks, 1):
+                write_yaml_format(idx, task, yaml_file_handle)
+    else:
+        for idx, task in enumerate(tasks, 1):
             print_yaml_format(idx, task)
             print()
-        
-        else:
-            write_yaml_format(idx, task, yaml_file_handle)
+
+    if stats is not None:
+        stats.lap('yaml_output', mark)
     
     return tasks
 
-def generate_task_set_with_iso(total_tasks, iso_tasks, mode_ratio=0.25, combined_elasticity=False, count=0):
+class TaskReport:
+    """
+    Per-task details as JSON lines, one object per accepted task, written
+    through a YAML_BUFFER_SIZE buffer. The compact counterpart of
+    print_detailed_task_info for runs that skip it with --quiet.
+    """
+
+    def __init__(self, filename):
+        self.file = open(filename, 'w', buffering=YAML_BUFFER_SIZE)
+
+    def write(self, task_num, task):
+        record = {'task': task_num}
+        for field in Task.__slots__:
+            if field not in ('modes', 'segments'):
+                record[field] = getattr(task, field)
+        record['modes'] = task.modes.data.tolist()
+        record['segments'] = task.segments.tolist() if task.segments is not None else None
+
+        # numpy scalars (CPU counts from the batch engine) are written as plain numbers
+        self.file.write(json.dumps(record, default=lambda value: value.item()))
+        self.file.write("\n")
+
+    def close(self):
+        self.file.close()
+
+class CountingWriter:
+    """Forwards writes to a file and counts the characters written (the YAML is ASCII, so bytes)"""
+
+    def __init__(self, file):
+        self.file = file
+        self.bytes_written = 0
+
+    def write(self, text):
+        self.bytes_written += len(text)
+        return self.file.write(text)
+
+def stream_task_set(tasks, filename=None, max_bytes=None, stats=None, pool_filename=None, report=None, mode_table_filename=None):
+    """
+    Write tasks from an iterable as YAML as soon as each one arrives, so only the
+    task being written is held in memory.
+
+    File output goes through a YAML_BUFFER_SIZE buffer and is flushed and closed
+    on return, including when stopping early. With max_bytes the run stops after
+    the task that brings the file to that size. Without a filename the tasks
+    are printed with print_yaml_format. With pool_filename every task is also
+    added to a binary pool, with mode_table_filename to a mode table, and with
+    a TaskReport to the report. Returns the number of tasks and bytes written.
+    """
+    written = 0
+    writer = None
+    pool_writer = None
+    table_file = None
+
+    try:
+        if filename:
+            yaml_file_handle = open(filename, 'w', buffering=YAML_BUFFER_SIZE)
+            writer = CountingWriter(yaml_file_handle)
+        if pool_filename:
+            pool_writer = PoolWriter(pool_filename)
+        if mode_table_filename:
+            table_file = open(mode_table_filename, 'w', buffering=YAML_BUFFER_SIZE)
+
+        for task in tasks:
+            written += 1
+            if stats is not None:
+                mark = time.perf_counter()
+
+            if writer is None:
+                print_yaml_format(written, task)
+                print()
+            else:
+                write_yaml_format(written, task, writer)
+
+            if pool_writer is not None:
+                pool_writer.add(yaml_elasticity(task), yaml_mode_times(task))
+            if table_file is not None:
+                table_file.write(mode_table_record(task) + "\n")
+            if report is not None:
+                report.write(written, task)
+
+            if stats is not None:
+                stats.lap('yaml_output', mark)
+
+            if max_bytes is not None and writer is not None and writer.bytes_written >= max_bytes:
+                break
+    finally:
+        # Stops the producer (and any worker processes) when ending early
+        if hasattr(tasks, 'close'):
+            tasks.close()
+        if writer is not None:
+            yaml_file_handle.close()
+        if pool_writer is not None:
+            pool_writer.close()
+        if table_file is not None:
+            table_file.close()
+
+    return written, writer.bytes_written if writer is not None else 0
+
+def generate_task_set_with_iso(total_tasks, iso_tasks, mode_ratio=0.25, combined_elasticity=False, count=0, batch_size=None,
+                               workers=None, seed=None, stats=None, constrained=False, keep_segments=True, verbose=True, report=None):
 
     if iso_tasks > total_tasks:
         raise ValueError("Number of isofunctional tasks cannot exceed total tasks")
     
     tasks = []
+
+    # Accepted batch rows not used yet, kept per kind of task
+    pending = {False: [], True: []}
+
+    if workers or seed is not None:
+        # Combined and regular tasks come from separate seed streams so each list is reproducible
+        num_combined = min(count, total_tasks) if combined_elasticity else 0
+        pending[True], _ = generate_tasks_parallel(num_combined, mode_ratio, None, True, seed or 0, workers,
+                                                   batch_size, stream=1, max_attempts=None, stats=stats, constrained=constrained,
+                                                   keep_segments=keep_segments)
+        pending[False], _ = generate_tasks_parallel(total_tasks - num_combined, mode_ratio, None, False, seed or 0,
+                                                    workers, batch_size, stream=0, max_attempts=None, stats=stats,
+                                                    keep_segments=keep_segments)
     
     print(f"\nGenerating {total_tasks} tasks ({iso_tasks} isofunctional)")
     
@@ -433,84 +1325,555 @@ def generate_task_set_with_iso(total_tasks, iso_tasks, mode_ratio=0.25, combined
             if combined_elasticity and i < count:
                 combined = True
 
-            task = generate_task(mode_ratio, None, combined)
+            if workers or seed is not None:
+                task = pending[combined].pop(0)
+            elif batch_size:
+                if not pending[combined]:
+                    pending[combined] = generate_task_batch(batch_size, mode_ratio, None, combined, stats=stats, constrained=constrained,
+                                                            keep_segments=keep_segments)
+                task = pending[combined].pop(0) if pending[combined] else None
+            else:
+                task = generate_task(mode_ratio, None, combined, stats=stats, constrained=constrained, keep_segments=keep_segments)
 
             if task is None:
                 continue
 
             else:
-                print(f"\n=== Regular Task {iso_tasks + i + 1} ===")
-                print_detailed_task_info(task)
+                # Regular tasks are numbered after the iso_tasks isofunctional ones, in the printout and the report
+                if verbose:
+                    print(f"\n=== Regular Task {iso_tasks + i + 1} ===")
+                    print_detailed_task_info(task)
+                if report is not None:
+                    report.write(iso_tasks + i + 1, task)
                 tasks.append(task)
                 break
     
     return tasks
 
+def iter_task_set_with_iso(total_tasks, mode_ratio=0.25, combined_elasticity=False, count=0, batch_size=None,
+                           workers=None, seed=None, stats=None, constrained=False, keep_segments=True):
+    """Streaming generate_task_set_with_iso: the combined-elasticity tasks first, then the regular ones"""
+    num_combined = min(count, total_tasks) if combined_elasticity else 0
+    yield from iter_tasks(num_combined, mode_ratio, None, True, batch_size, workers, seed, stats, constrained,
+                          stream=1, max_attempts=None, keep_segments=keep_segments)
+    yield from iter_tasks(total_tasks - num_combined, mode_ratio, None, False, batch_size, workers, seed, stats,
+                          stream=0, max_attempts=None, keep_segments=keep_segments)
+
+def uunifast(n, total, rng):
+    """UUniFast: n non-negative shares summing to total, uniform over the simplex"""
+    if n == 1:
+        return np.array([float(total)])
+    remaining = total * np.cumprod(rng.uniform(0, 1, n - 1) ** (1 / np.arange(n - 1, 0, -1)))
+    return -np.diff(np.concatenate(([total], remaining, [0.0])))
+
+def split_cpu_demand(total, lows, highs, rng):
+    """
+    Split an integer CPU total across tasks, task i getting between lows[i]
+    and highs[i]. The surplus over the lows is split with UUniFast and
+    rounded by largest remainder; counts over a task's cap are handed on a
+    CPU at a time to random tasks that still have room.
+    """
+    lows = np.asarray(lows, dtype=np.int64)
+    caps = np.asarray(highs, dtype=np.int64) - lows
+    if not lows.sum() <= total <= lows.sum() + caps.sum():
+        raise ValueError(f"A total of {total} CPUs cannot be split into {len(lows)} tasks of {lows.min()} to {(lows + caps).max()} CPUs")
+
+    shares = uunifast(len(lows), total - lows.sum(), rng)
+    counts = np.floor(shares).astype(np.int64)
+    counts[np.argsort(counts - shares)[:total - lows.sum() - counts.sum()]] += 1
+
+    counts = np.minimum(counts, caps)
+    for _ in range(total - lows.sum() - counts.sum()):
+        room = np.flatnonzero(counts < caps)
+        counts[room[int(rng.uniform(0, len(room)))]] += 1
+
+    return lows + counts
+
+def reachable_cpu_targets(mode_ratio=0.25, rng=None, probe_size=TARGET_PROBE_SIZE):
+    """
+    (min_cpus_a, max_cpus_a, min_cpus_b, max_cpus_b) tuples of regular tasks
+    accepted from probe_size unconstrained candidates, and how often each was
+    seen. Targets outside these are possible in principle but so rarely
+    drawn that conditioning on them mostly rejects.
+    """
+    seen = Counter()
+    for task in generate_task_batch(probe_size, mode_ratio, None, False, rng, keep_segments=False):
+        seen[(task.min_cpus_a, task.max_cpus_a, task.min_cpus_b, task.max_cpus_b)] += 1
+    return np.array(list(seen), dtype=np.int64), np.array(list(seen.values()))
+
+def split_cpu_targets(num_tasks, min_a, max_a, min_b, max_b, mode_ratio=0.25, rng=None):
+    """
+    Per-task (min_cpus_a, max_cpus_a, min_cpus_b, max_cpus_b) targets summing
+    exactly to the given totals.
+
+    The min counts and the growth to the max counts are split with
+    split_cpu_demand. Each share is then moved to the closest tuple of
+    reachable_cpu_targets, and single tasks are switched to other reachable
+    tuples until the totals are met again. Raises ValueError when they cannot be.
+    """
+    rng = np.random if rng is None else rng
+    low = np.full(num_tasks, MIN_ALLOWED_CPUS)
+    high = np.full(num_tasks, MAX_ALLOWED_CPUS)
+
+    min_cpus_a = split_cpu_demand(min_a, low, high, rng)
+    min_cpus_b = split_cpu_demand(min_b, low, high, rng)
+    growth_a = split_cpu_demand(max_a - min_a, np.zeros(num_tasks), MAX_ALLOWED_CPUS - min_cpus_a, rng)
+    growth_b = split_cpu_demand(max_b - min_b, np.zeros(num_tasks), MAX_ALLOWED_CPUS - min_cpus_b, rng)
+    shares = np.stack([min_cpus_a, min_cpus_a + growth_a, min_cpus_b, min_cpus_b + growth_b], axis=1)
+
+    reachable, seen = reachable_cpu_targets(mode_ratio, rng)
+    # Among equally close tuples, the most often drawn one wins
+    order = np.argsort(-seen, kind='stable')
+    reachable = reachable[order]
+
+    distance = np.abs(shares[:, None, :] - reachable[None, :, :]).sum(axis=2)
+    targets = reachable[np.argmin(distance, axis=1)]
+
+    # Switch one random task at a time to the reachable tuple that best closes the gap,
+    # also taking sideways moves so the search can walk across plateaus
+    totals = np.array([min_a, max_a, min_b, max_b])
+    for _ in range(TARGET_REPAIR_STEPS * num_tasks):
+        gap = totals - targets.sum(axis=0)
+        if not gap.any():
+            return targets
+
+        i = int(rng.uniform(0, num_tasks))
+        error = np.abs(gap + targets[i] - reachable).sum(axis=1)
+        best = np.flatnonzero(error == error.min())
+        if error[best[0]] <= np.abs(gap).sum():
+            targets[i] = reachable[best[int(rng.uniform(0, len(best)))]]
+
+    raise ValueError(f"CPU demand A {min_a}-{max_a}, B {min_b}-{max_b} cannot be split into {num_tasks} reachable tasks")
+
+def generate_targeted_task_set(num_tasks, cpu_targets, mode_ratio=0.25, batch_size=None, seed=None, stats=None, keep_segments=True,
+                               verbose=True, report=None, max_attempts=1000000):
+    """
+    Generate regular tasks whose CPU demand adds up to cpu_targets, the total
+    (min_a, max_a, min_b, max_b) over the set.
+
+    split_cpu_targets gives every task its share, and candidates are drawn in
+    batches conditioned on the shares still open (generate_task_batch with
+    targets), so each accepted candidate fills an open slot of its own tuple
+    and no set is thrown away for missing the load. Uses the global numpy
+    state, or a Generator seeded with seed.
+    """
+    rng = np.random if seed is None else np.random.default_rng(seed)
+    batch_size = batch_size or 256
+
+    targets = split_cpu_targets(num_tasks, *cpu_targets, mode_ratio, rng)
+    slots = defaultdict(deque)
+    for index, target in enumerate(map(tuple, targets.tolist())):
+        slots[target].append(index)
+
+    print(f"\nGenerating {num_tasks} tasks for CPU demand A {cpu_targets[0]}-{cpu_targets[1]}, B {cpu_targets[2]}-{cpu_targets[3]}")
+
+    tasks = [None] * num_tasks
+    attempts = 0
+    while slots and attempts < max_attempts:
+        open_targets = np.array([target for target, indices in slots.items() for _ in indices])
+        candidates = generate_task_batch(batch_size, mode_ratio, None, False, rng, stats=stats, keep_segments=keep_segments,
+                                         targets=open_targets[np.arange(batch_size) % len(open_targets)])
+        attempts += batch_size
+
+        for task in candidates:
+            target = (task.min_cpus_a, task.max_cpus_a, task.min_cpus_b, task.max_cpus_b)
+            if target in slots:
+                tasks[slots[target].popleft()] = task
+                if not slots[target]:
+                    del slots[target]
+
+    if slots:
+        print("\nWarning: Reached maximum attempts to generate valid tasks. Some tasks may be missing.")
+
+    tasks = [task for task in tasks if task is not None]
+    for task_num, task in enumerate(tasks, 1):
+        if verbose:
+            print(f"\n=== Regular Task {task_num} ===")
+            print_detailed_task_info(task)
+        if report is not None:
+            report.write(task_num, task)
+
+    return tasks
+
+def count_pool_tasks(filename):
+    """Number of tasks already in a YAML pool; 0 if it does not exist yet"""
+    if not Path(filename).exists():
+        return 0
+    return sum(1 for _ in iter_yaml_blocks(filename))
+
+def build_pools(num_tasks, output_dir='3000s', categories=None, seed=0, workers=None, batch_size=None, stats=None,
+                constrained=False, dedup=False):
+    """
+    Bring the YAML pool of each category in POOL_CATEGORIES up to num_tasks tasks.
+
+    Task i of a pool always comes from chunk i // PARALLEL_CHUNK_SIZE of the
+    category's seed stream, so a pool holding n tasks is topped up by drawing
+    only the chunks from task n onward, and topping up gives the same file as
+    building the larger pool in one go. The chunks of every category share one
+    worker pool. A binary .pool file next to a topped up pool is rebuilt, and
+    the pool's mode table is extended with the new tasks; a pool whose table
+    does not cover its existing tasks gets none.
+
+    With dedup, tasks whose signature (pool.task_signature) is already in the
+    pool are skipped and chunks are drawn until the pool is full, giving up
+    after DEDUP_MAX_CHUNKS times the chunks a full pool takes. A top-up draws
+    the chunks it cannot tell apart again; their tasks are all duplicates, so
+    the file still matches a build in one go.
+    Returns the number of tasks added per category.
+    """
+    categories = list(POOL_CATEGORIES) if categories is None else categories
+    num_chunks = -(-num_tasks // PARALLEL_CHUNK_SIZE)
+
+    # Tasks in each pool being filled, the chunk to start from and the pool's signatures (with dedup)
+    pools = {}
+    added = {}
+    tables = set()
+    for category in categories:
+        filename = POOL_CATEGORIES[category][0]
+        path = Path(output_dir) / filename
+        added[category] = 0
+
+        index = None
+        if dedup:
+            index = SignatureIndex()
+            for block in (iter_yaml_blocks(path) if path.exists() else ()):
+                index.add(parse_block(block)[1])
+            existing = len(index.signatures)
+        else:
+            existing = count_pool_tasks(path)
+
+        if existing >= num_tasks:
+            continue
+
+        table = load_mode_table(mode_table_path(path))
+        if len(table or []) == existing:
+            tables.add(category)
+        else:
+            print(f"Warning: {mode_table_path(path)} does not match the {existing} tasks of its pool; not extending it")
+
+        pools[category] = {'count': existing, 'first_chunk': existing // PARALLEL_CHUNK_SIZE, 'index': index}
+
+    # Category and chunk number of every submitted job, in the order the results come back
+    plan = deque()
+
+    def chunk_jobs():
+        for category, pool in pools.items():
+            _, mode_ratio, skewness_ratio, combined_elasticity, isofunctional, stream = POOL_CATEGORIES[category]
+            last_chunk = DEDUP_MAX_CHUNKS * num_chunks if dedup else num_chunks
+
+            # Workers run ahead of the results, so a deduplicated pool may get a few chunks it does not need
+            i = pool['first_chunk']
+            while pool['count'] < num_tasks and i < last_chunk:
+                plan.append((category, i))
+                yield (np.random.SeedSequence(seed, spawn_key=(stream, i)), PARALLEL_CHUNK_SIZE, mode_ratio, skewness_ratio,
+                       combined_elasticity, isofunctional, batch_size, None, stats is not None, constrained, False, platform())
+                i += 1
+
+    Path(output_dir).mkdir(parents=True, exist_ok=True)
+    files = {}
+    table_files = {}
+    try:
+        for chunk_tasks, _, chunk_stats in run_chunk_jobs(chunk_jobs(), workers):
+            category, i = plan.popleft()
+            pool = pools[category]
+            if category not in files:
+                files[category] = open(Path(output_dir) / POOL_CATEGORIES[category][0], 'a', buffering=YAML_BUFFER_SIZE)
+                if category in tables:
+                    table_files[category] = open(mode_table_path(Path(output_dir) / POOL_CATEGORIES[category][0]), 'a',
+                                                 buffering=YAML_BUFFER_SIZE)
+            if stats is not None:
+                stats.merge(chunk_stats)
+                mark = time.perf_counter()
+
+            duplicates = 0
+            for offset, task in enumerate(chunk_tasks):
+                if pool['count'] >= num_tasks:
+                    break
+                if pool['index'] is None:
+                    # Tasks before the end of the pool are already in it
+                    if i * PARALLEL_CHUNK_SIZE + offset < pool['count']:
+                        continue
+                elif not pool['index'].add(yaml_mode_times(task)):
+                    duplicates += 1
+                    continue
+
+                write_yaml_format(0, task, files[category])
+                if category in table_files:
+                    table_files[category].write(mode_table_record(task) + "\n")
+                pool['count'] += 1
+                added[category] += 1
+
+            if stats is not None:
+                _, _, skewness_ratio, combined_elasticity, _, _ = POOL_CATEGORIES[category]
+                stats.reject(task_category(skewness_ratio, combined_elasticity), 'duplicate_signature', duplicates)
+                stats.lap('yaml_output', mark)
+    finally:
+        for yaml_file_handle in files.values():
+            yaml_file_handle.close()
+        for table_file in table_files.values():
+            table_file.close()
+
+    for category, pool in pools.items():
+        if pool['count'] < num_tasks:
+            print(f"Warning: only {pool['count']} tasks with distinct signatures found for the {category} pool")
+
+    for category in files:
+        yaml_path = Path(output_dir) / POOL_CATEGORIES[category][0]
+        if yaml_path.with_suffix('.pool').exists():
+            convert_yaml_pool(yaml_path, yaml_path.with_suffix('.pool'))
+
+    return added
+
 def print_detailed_task_info(task):
     """Print detailed information about a task"""
-    print(f"Skewness Ratio: {task['skewness_ratio']:.2f}")
-    print(f"Span A: {task['span_a']:.2f}ms")
-    print(f"Span B: {task['span_b']:.2f}ms")
-    print(f"Period: {task['period']:.2f}ms")
+    print(f"Skewness Ratio: {task.skewness_ratio:.2f}")
+    print(f"Span A: {task.span_a:.2f}ms")
+    print(f"Span B: {task.span_b:.2f}ms")
+    print(f"Period: {task.period:.2f}ms")
     
     print("\nWork Type A:")
-    print(f"  Min Work: {task['min_work_a']:.2f}ms")
-    print(f"  Max Work: {task['max_work_a']:.2f}ms")
-    print(f"  Min CPUs: {task['min_cpus_a']}")
-    print(f"  Max CPUs: {task['max_cpus_a']}")
+    print(f"  Min Work: {task.min_work_a:.2f}ms")
+    print(f"  Max Work: {task.max_work_a:.2f}ms")
+    print(f"  Min CPUs: {task.min_cpus_a}")
+    print(f"  Max CPUs: {task.max_cpus_a}")
     
     print("\nWork Type B:")
-    print(f"  Min Work: {task['min_work_b']:.2f}ms")
-    print(f"  Max Work: {task['max_work_b']:.2f}ms")
-    print(f"  Min CPUs: {task['min_cpus_b']}")
-    print(f"  Max CPUs: {task['max_cpus_b']}")
+    print(f"  Min Work: {task.min_work_b:.2f}ms")
+    print(f"  Max Work: {task.max_work_b:.2f}ms")
+    print(f"  Min CPUs: {task.min_cpus_b}")
+    print(f"  Max CPUs: {task.max_cpus_b}")
     
-    print(f"\nElasticity: {task['elasticity']:.3f}")
+    print(f"\nElasticity: {task.elasticity:.3f}")
     
-    print("\nSegments (length, (min_strands, max_strands), type):")
-    for idx, (length, strands, type_) in enumerate(task['segments'], 1):
-        print(f"  Segment {idx}: {length:.2f}ms, {strands}, Type {type_}")
+    if task.segments is not None:
+        print("\nSegments (length, (min_strands, max_strands), type):")
+        for idx, (length, min_strands, max_strands, type_) in enumerate(task.segments.tolist(), 1):
+            print(f"  Segment {idx}: {length:.2f}ms, ({min_strands}, {max_strands}), Type {type_}")
     
     print("\nModes:")
-    for idx, mode in enumerate(task['mode_info'], 1):
+    for idx, (period, work_a, work_b, cpus_a, cpus_b) in enumerate(task.modes.data.tolist(), 1):
         print(f"  Mode {idx}:")
-        print(f"    Period: {mode['period']:.2f}ms")
-        print(f"    Total Work: {mode['total_work']:.2f}ms")
-        print(f"    Work Type A: {mode['work_a']:.2f}ms")
-        print(f"    Work Type B: {mode['work_b']:.2f}ms")
-        print(f"    Total CPUs: {mode['total_cpus']}")
-        print(f"    CPUs Type A: {mode['cpus_a']}")
-        print(f"    CPUs Type B: {mode['cpus_b']}")
+        print(f"    Period: {period:.2f}ms")
+        print(f"    Total Work: {work_a + work_b:.2f}ms")
+        print(f"    Work Type A: {work_a:.2f}ms")
+        print(f"    Work Type B: {work_b:.2f}ms")
+        print(f"    Total CPUs: {cpus_a + cpus_b}")
+        print(f"    CPUs Type A: {cpus_a}")
+        print(f"    CPUs Type B: {cpus_b}")
+
+def main(args=None):
+    """
+    Run one gen.py command line (sys.argv[1:] when args is None) and return
+    the file or directory it wrote, if any. Failures exit with status 1.
+    """
+    np.random.seed(0)
 
-if __name__ == "__main__":
+    # Optional flags are pulled out first so the positional arguments keep their meaning
+    option_parser = argparse.ArgumentParser(add_help=False)
+    option_parser.add_argument('--batch-size', type=int, default=None)
+    option_parser.add_argument('--workers', type=int, default=None)
+    option_parser.add_argument('--seed', type=int, default=None)
+    option_parser.add_argument('--stats-json', default=None)
+    option_parser.add_argument('--constrained', action='store_true')
+    option_parser.add_argument('--stream', action='store_true')
+    option_parser.add_argument('--no-segments', action='store_true')
+    option_parser.add_argument('--max-bytes', type=int, default=None)
+    option_parser.add_argument('--pool-file', default=None)
+    option_parser.add_argument('--mode-table', default=None)
+    option_parser.add_argument('--categories', default=','.join(POOL_CATEGORIES))
+    option_parser.add_argument('--dedup', action='store_true')
+    option_parser.add_argument('--processors', type=int, default=None)
+    option_parser.add_argument('--min-cpus', type=int, default=None)
+    option_parser.add_argument('--max-cpus', type=int, default=None)
+    option_parser.add_argument('--quiet', action='store_true')
+    option_parser.add_argument('--report', default=None)
+    option_parser.add_argument('--socket', default=None)
+    instrument.add_arguments(option_parser)
+    options, argv = option_parser.parse_known_args(sys.argv[1:] if args is None else args)
+    argv = [sys.argv[0]] + argv
+
+    if argv[1:2] == ['serve']:
+        if args is not None:
+            print("Error: a serve request cannot start another server")
+            sys.exit(1)
+        serve_requests(options.socket)
+        return None
 
-    np.random.seed(0)
+    timings = instrument.start('gen.py', options.profile, options.timings)
+
+    try:
+        configure_platform(options.processors, options.min_cpus, options.max_cpus)
+    except ValueError as e:
+        print(f"Error: {e}")
+        sys.exit(1)
 
-    if len(sys.argv) < 2:
+    # --timings reads its generation and YAML stages from the GenerationStats counters
+    stats = GenerationStats() if options.stats_json or options.timings else None
+
+    def collect_generation_stages(timings):
+        generation = {stage: seconds for stage, seconds in stats.stage_seconds.items() if stage != 'yaml_output'}
+        for stage, seconds in generation.items():
+            timings.add_seconds(f'generate/{stage}', seconds)
+        timings.add_seconds('generate', sum(generation.values()))
+        timings.count('generate', sum(stats.accepted.values()), 'tasks')
+        timings.count('generate', sum(stats.attempts.values()), 'candidates')
+        timings.add_seconds('yaml_output', stats.stage_seconds.get('yaml_output', 0.0))
+
+    timings.add_collector(collect_generation_stages)
+
+    report = TaskReport(options.report) if options.report else None
+    try:
+        return run_command(argv, options, stats, report, timings)
+    finally:
+        if report is not None:
+            report.close()
+
+def serve_requests(socket_path=None):
+    """
+    gen.py serve: run the gen.py command line of every JSON-line request (see
+    serve.py) in this process, with numpy and the generator already loaded.
+    Each request starts from the seed, platform and iso flag a fresh process has.
+    """
+    default_platform = platform()
+    default_iso = iso
+
+    def run(args):
+        global iso
+        if {'--profile', '--timings'} & {arg.split('=')[0] for arg in args}:
+            print("Error: --profile and --timings apply to the server, not to a request")
+            sys.exit(1)
+        try:
+            return main(args)
+        finally:
+            configure_platform(*default_platform)
+            iso = default_iso
+
+    serve.serve(run, socket_path)
+
+def run_command(argv, options, stats, report, timings):
+    """The gen.py command in argv with its options; returns what main returns"""
+    # The commands set the module-level iso flag that the generators read, as the old __main__ block did
+    global iso
+
+    if len(argv) < 2:
         print("Usage: python3 script.py [num_tasks] [mode_ratio] [skewness_ratio] [output_file]")
         print("   or: python3 script.py set [total_tasks] [iso_tasks] [likely_unsafe_combined_elasticity_tasks] [iso_mirror = true]")
+        print("   or: python3 script.py pools [tasks_per_pool] [output_dir = 3000s] [--categories workload,comb,iso]")
+        print("   or: python3 script.py target [num_tasks] [min_cpus_a] [max_cpus_a] [min_cpus_b] [max_cpus_b] [output_file]")
+        print("   or: python3 script.py serve [--socket PATH]")
         sys.exit(1)
+
+    if argv[1] == "target":
+        if len(argv) < 7:
+            print("Usage: python3 script.py target [num_tasks] [min_cpus_a] [max_cpus_a] [min_cpus_b] [max_cpus_b] [output_file]")
+            sys.exit(1)
+
+        filename = argv[7] if len(argv) > 7 else None
+        try:
+            tasks = generate_targeted_task_set(int(argv[2]), tuple(int(arg) for arg in argv[3:7]), 0.25, options.batch_size, options.seed,
+                                               stats, not options.no_segments, not options.quiet, report)
+        except ValueError as e:
+            print(f"Error: {e}")
+            sys.exit(1)
+
+        with timings.stage('yaml_output'):
+            if filename:
+                print("\n=== YAML Format Output To File ===")
+                with open(filename, 'w') as yaml_file_handle:
+                    for idx, task in enumerate(tasks, 1):
+                        write_yaml_format(idx, task, yaml_file_handle)
+            else:
+                print("\n=== YAML Format Output ===")
+                for idx, task in enumerate(tasks, 1):
+                    print_yaml_format(idx, task)
+                    print()
+
+        if options.pool_file:
+            with timings.stage('pool_output'):
+                write_binary_pool(tasks, options.pool_file)
+        if options.mode_table:
+            with timings.stage('mode_table_output'):
+                write_mode_table(tasks, options.mode_table)
+
+        print(f"\nFinal CPU Allocation:")
+        print(f"Total Min CPUs Type A: {sum(task.min_cpus_a for task in tasks)}")
+        print(f"Total CPUs Type A used: {sum(int(task.modes.cpus_a.max()) for task in tasks)}")
+        print(f"Total Min CPUs Type B: {sum(task.min_cpus_b for task in tasks)}")
+        print(f"Total CPUs Type B used: {sum(int(task.modes.cpus_b.max()) for task in tasks)}")
+
+        if options.stats_json:
+            stats.write_json(options.stats_json)
+        return filename
+
+    if argv[1] == "pools":
+        if len(argv) < 3:
+            print("Usage: python3 script.py pools [tasks_per_pool] [output_dir = 3000s] [--categories workload,comb,iso]")
+            sys.exit(1)
+
+        categories = options.categories.split(',')
+        unknown = [category for category in categories if category not in POOL_CATEGORIES]
+        if unknown:
+            print(f"Error: unknown pool categories {', '.join(unknown)} (choose from {', '.join(POOL_CATEGORIES)})")
+            sys.exit(1)
+
+        output_dir = argv[3] if len(argv) > 3 else '3000s'
+        added = build_pools(int(argv[2]), output_dir, categories, options.seed or 0, options.workers, options.batch_size, stats,
+                            options.constrained, options.dedup)
+        for category, count in added.items():
+            print(f"{category}: added {count} tasks to {Path(output_dir) / POOL_CATEGORIES[category][0]}")
+
+        if options.stats_json:
+            stats.write_json(options.stats_json)
+        return output_dir
         
-    if sys.argv[1] == "set":
-        if len(sys.argv) < 4:
+    if argv[1] == "set":
+        if len(argv) < 4:
             print("Usage: python3 script.py set [total_tasks] [iso_tasks] [likely_unsafe_combined_elasticity_tasks] [iso_mirror = true]")
             sys.exit(1)
             
-        total_tasks = int(sys.argv[2])
-        iso_tasks = int(sys.argv[3])
-        likely_unsafe_combined_elasticity_tasks = int(sys.argv[4])
+        total_tasks = int(argv[2])
+        iso_tasks = int(argv[3])
+        likely_unsafe_combined_elasticity_tasks = int(argv[4])
         
         try:
             filename = None
-            if len(sys.argv) >= 5:
-                filename = sys.argv[5]
+            if len(argv) >= 5:
+                filename = argv[5]
             
-            if len(sys.argv) == 7:
+            if len(argv) == 7:
                 iso = False
             else:
                 iso = True
 
-            tasks = generate_task_set_with_iso(total_tasks, iso_tasks, 0.25, likely_unsafe_combined_elasticity_tasks > 0, likely_unsafe_combined_elasticity_tasks)
+            if options.stream:
+                allocation = {'a': 0, 'b': 0}
+
+                def tally(tasks):
+                    try:
+                        for task in tasks:
+                            allocation['a'] += int(task.modes.cpus_a.max())
+                            allocation['b'] += int(task.modes.cpus_b.max())
+                            yield task
+                    finally:
+                        tasks.close()
+
+                tasks = iter_task_set_with_iso(total_tasks, 0.25, likely_unsafe_combined_elasticity_tasks > 0, likely_unsafe_combined_elasticity_tasks,
+                                               options.batch_size, options.workers, options.seed, stats, options.constrained,
+                                               not options.no_segments)
+                written, size = stream_task_set(tally(tasks), filename, options.max_bytes, stats, options.pool_file, report,
+                                                options.mode_table)
+                print(f"\nWrote {written} tasks ({size} bytes) to {filename or 'stdout'}")
+                print(f"\nFinal CPU Allocation:")
+                print(f"Total CPUs Type A used: {allocation['a']}")
+                print(f"Total CPUs Type B used: {allocation['b']}")
+
+                if options.stats_json:
+                    stats.write_json(options.stats_json)
+                return filename
+
+            tasks = generate_task_set_with_iso(total_tasks, iso_tasks, 0.25, likely_unsafe_combined_elasticity_tasks > 0, likely_unsafe_combined_elasticity_tasks,
+                                               options.batch_size, options.workers, options.seed, stats, options.constrained,
+                                               not options.no_segments, not options.quiet, report)
 
             if filename:
                 print("\n=== YAML Format Output To File ===")
@@ -518,19 +1881,26 @@ if __name__ == "__main__":
             else:
                 print("\n=== YAML Format Output ===")
 
-            yaml_file_handle = open(filename, 'w') if filename else None
-            for idx, task in enumerate(tasks, 1):
-
-                if filename == None:
-                    print_yaml_format(idx, task)
-                    print()
-                
+            with timings.stage('yaml_output'):
+                if filename:
+                    with open(filename, 'w') as yaml_file_handle:
+                        for idx, task in enumerate(tasks, 1):
+                            write_yaml_format(idx, task, yaml_file_handle)
                 else:
-                    write_yaml_format(idx, task, yaml_file_handle)
+                    for idx, task in enumerate(tasks, 1):
+                        print_yaml_format(idx, task)
+                        print()
+
+            if options.pool_file:
+                with timings.stage('pool_output'):
+                    write_binary_pool(tasks, options.pool_file)
+            if options.mode_table:
+                with timings.stage('mode_table_output'):
+                    write_mode_table(tasks, options.mode_table)
             
             # Print final CPU allocation summary
-            total_cpus_a = sum(max(mode['cpus_a'] for mode in task['mode_info']) for task in tasks)
-            total_cpus_b = sum(max(mode['cpus_b'] for mode in task['mode_info']) for task in tasks)
+            total_cpus_a = sum(int(task.modes.cpus_a.max()) for task in tasks)
+            total_cpus_b = sum(int(task.modes.cpus_b.max()) for task in tasks)
             print(f"\nFinal CPU Allocation:")
             print(f"Total CPUs Type A used: {total_cpus_a}")
             print(f"Total CPUs Type B used: {total_cpus_b}")
@@ -540,14 +1910,39 @@ if __name__ == "__main__":
             sys.exit(1)
     else:
         # Original command-line handling
-        skew = float(sys.argv[3])
+        skew = float(argv[3])
         if skew == -1:
             skew = None
         if skew == 0:
             skew = 1.0
             iso = True
         
-        if len(sys.argv) == 4:
-            tasks = generate_task_set(int(sys.argv[1]), float(sys.argv[2]), skew)
+        if options.stream:
+            tasks = iter_tasks(int(argv[1]), float(argv[2]), skew, batch_size=options.batch_size, workers=options.workers,
+                               seed=options.seed, stats=stats, keep_segments=not options.no_segments)
+            written, size = stream_task_set(tasks, argv[4] if len(argv) > 4 else None, options.max_bytes, stats, options.pool_file,
+                                            report, options.mode_table)
+            print(f"\nWrote {written} tasks ({size} bytes) to {argv[4] if len(argv) > 4 else 'stdout'}")
+        elif len(argv) == 4:
+            tasks = generate_task_set(int(argv[1]), float(argv[2]), skew, None, options.batch_size, options.workers, options.seed, stats,
+                                      not options.no_segments, not options.quiet, report)
         else:
-            tasks = generate_task_set(int(sys.argv[1]), float(sys.argv[2]), skew, sys.argv[4])
+            tasks = generate_task_set(int(argv[1]), float(argv[2]), skew, argv[4], options.batch_size, options.workers, options.seed, stats,
+                                      not options.no_segments, not options.quiet, report)
+
+        if options.pool_file and not options.stream:
+            with timings.stage('pool_output'):
+                write_binary_pool(tasks, options.pool_file)
+        if options.mode_table and not options.stream:
+            with timings.stage('mode_table_output'):
+                write_mode_table(tasks, options.mode_table)
+
+    if options.stats_json:
+        stats.write_json(options.stats_json)
+
+    if argv[1] == "set":
+        return filename
+    return argv[4] if len(argv) > 4 else None
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,138 @@
+#!/usr/bin/env python3
+
+"""
+Opt-in instrumentation shared by the command-line scripts.
+
+    --profile FILE   run the command under cProfile and dump pstats to FILE
+                     (read it with `python -m pstats FILE`)
+    --timings FILE   write a JSON summary of named stage timers and their
+                     counters (tasks/s, MB/s, lines/s, ...) to FILE, or to
+                     stderr with '-'
+
+Both are written when the interpreter exits, so commands that end in
+sys.exit are covered. Without either flag the scripts get NULL_TIMINGS,
+whose stages are a shared no-op context manager.
+"""
+
+import atexit
+import cProfile
+import json
+import os
+import sys
+import time
+from contextlib import contextmanager, nullcontext
+
+def add_arguments(parser):
+    """Add --profile and --timings to an argparse parser"""
+    parser.add_argument('--profile', default=None, metavar='FILE', help='write cProfile statistics of the whole run to FILE')
+    parser.add_argument('--timings', default=None, metavar='FILE', help="write per-stage times and rates as JSON to FILE ('-' for stderr)")
+
+def startup_seconds():
+    """Seconds from process start to now (interpreter startup and imports), where /proc provides it"""
+    try:
+        with open('/proc/self/stat') as f:
+            # Fields after the command name; starttime is field 22 of the whole line
+            fields = f.read().rsplit(')', 1)[1].split()
+        return time.clock_gettime(time.CLOCK_BOOTTIME) - int(fields[19]) / os.sysconf('SC_CLK_TCK')
+    except (OSError, ValueError, IndexError, AttributeError):
+        return None
+
+class Timings:
+    """Named stage timers, each with counters of the items it processed"""
+
+    def __init__(self, command):
+        self.command = command
+        self.startup = startup_seconds()
+        self.started = time.perf_counter()
+        self.seconds = {}
+        self.counts = {}
+        self.collectors = []
+
+    @contextmanager
+    def stage(self, name):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.add_seconds(name, time.perf_counter() - start)
+
+    def add_seconds(self, name, seconds):
+        self.seconds[name] = self.seconds.get(name, 0.0) + seconds
+
+    def count(self, name, amount, unit):
+        """Count amount units (tasks, MB, lines, ...) processed in stage name"""
+        counts = self.counts.setdefault(name, {})
+        counts[unit] = counts.get(unit, 0) + amount
+
+    def add_collector(self, collector):
+        """Call collector(self) just before the summary is written, to add stages timed elsewhere"""
+        self.collectors.append(collector)
+
+    def to_dict(self):
+        for collector in self.collectors:
+            collector(self)
+
+        stages = {}
+        for name in self.seconds.keys() | self.counts.keys():
+            seconds = self.seconds.get(name, 0.0)
+            stage = {'seconds': seconds}
+            for unit, amount in self.counts.get(name, {}).items():
+                stage[unit] = amount
+                stage[f'{unit}_per_second'] = amount / seconds if seconds > 0 else None
+            stages[name] = stage
+
+        return {
+            'command': self.command,
+            'startup_seconds': self.startup,
+            'total_seconds': time.perf_counter() - self.started,
+            'stages': dict(sorted(stages.items(), key=lambda item: -item[1]['seconds'])),
+        }
+
+    def write(self, filename):
+        summary = json.dumps(self.to_dict(), indent=2)
+        if filename == '-':
+            print(summary, file=sys.stderr)
+        else:
+            with open(filename, 'w') as f:
+                f.write(summary + "\n")
+
+class NullTimings:
+    """Stand-in when --timings is off: every call does nothing"""
+
+    _stage = nullcontext()
+
+    def stage(self, name):
+        return self._stage
+
+    def add_seconds(self, name, seconds):
+        pass
+
+    def count(self, name, amount, unit):
+        pass
+
+    def add_collector(self, collector):
+        pass
+
+NULL_TIMINGS = NullTimings()
+
+def _dump_profile(profiler, filename):
+    profiler.disable()
+    profiler.dump_stats(filename)
+    print(f"Wrote profile to {filename}", file=sys.stderr)
+
+def start(command, profile=None, timings=None):
+    """
+    Start the instrumentation chosen on the command line and return the
+    Timings to record stages with (NULL_TIMINGS when --timings is off)
+    """
+    if profile:
+        profiler = cProfile.Profile()
+        atexit.register(_dump_profile, profiler, profile)
+        profiler.enable()
+
+    if not timings:
+        return NULL_TIMINGS
+
+    recorder = Timings(command)
+    atexit.register(recorder.write, timings)
+    return recorder
@@ -0,0 +1,322 @@
+#!/usr/bin/env python3
+
+"""
+Binary task pools.
+
+A pool file holds the same tasks as a YAML pool written by gen.py, in a form
+that can be memory-mapped and read one task at a time:
+
+    header   magic, task count, mode count, offset of the index
+    modes    one fixed-width record per mode: work, span, gpu_work, gpu_span
+             and period in nanoseconds (five little-endian int64)
+    index    task count + 1 mode offsets (task i owns modes offsets[i] up to
+             offsets[i + 1]) followed by one elasticity value per task
+
+Rendering a task gives back its YAML block exactly as selector.py reads it
+from the text pool, so either format produces the same task sets.
+
+A YAML pool or task set can also have a mode table next to it (same name,
+MODE_TABLE_SUFFIX): one JSON line per task, in task order, listing the CPU
+demand gen.py computed for each of the task's modes.
+
+A task's signature (task_signature) identifies tasks that would look the same
+to the scheduler; SignatureIndex maps the signatures of a pool to its tasks.
+"""
+
+import argparse
+import math
+import mmap
+import os
+import re
+import struct
+from collections.abc import Sequence
+from pathlib import Path
+
+MAGIC = b'ETPOOL\x00\x01'
+HEADER = struct.Struct('<8sQQQ')
+MODE_RECORD = struct.Struct('<5q')
+OFFSET = struct.Struct('<Q')
+
+NS_PER_SEC = 1_000_000_000
+
+# Periods this close together count as the same in a task signature
+PERIOD_QUANTUM_NS = 10_000_000
+
+MODE_TABLE_SUFFIX = '.modes.jsonl'
+
+MODE_FIELDS = ('work', 'span', 'gpu_work', 'gpu_span', 'period')
+MODE_LINE = re.compile(r'(work|span|gpu_work|gpu_span|period): \{sec: (\d+), nsec: (\d+)\}')
+ELASTICITY_LINE = re.compile(r'elasticity: (\d+)')
+
+def render_block(elasticity, modes):
+    """YAML block for one task, without the leading indent and trailing newline"""
+    lines = ['- program:', '      name: prog', '      args: "0"', f'    elasticity: {elasticity}', '    modes:']
+    for work, span, gpu_work, gpu_span, period in modes:
+        lines.append(f'      - work: {{sec: {work // NS_PER_SEC}, nsec: {work % NS_PER_SEC}}}')
+        lines.append(f'        span: {{sec: {span // NS_PER_SEC}, nsec: {span % NS_PER_SEC}}}')
+        lines.append(f'        gpu_work: {{sec: {gpu_work // NS_PER_SEC}, nsec: {gpu_work % NS_PER_SEC}}}')
+        lines.append(f'        gpu_span: {{sec: {gpu_span // NS_PER_SEC}, nsec: {gpu_span % NS_PER_SEC}}}')
+        lines.append(f'        period: {{sec: {period // NS_PER_SEC}, nsec: {period % NS_PER_SEC}}}')
+    return '\n'.join(lines)
+
+def parse_block(block):
+    """Elasticity and mode records of one YAML task block"""
+    elasticity = int(ELASTICITY_LINE.search(block).group(1))
+
+    times = [int(sec) * NS_PER_SEC + int(nsec) for _, sec, nsec in MODE_LINE.findall(block)]
+    modes = [tuple(times[i:i + len(MODE_FIELDS)]) for i in range(0, len(times), len(MODE_FIELDS))]
+    return elasticity, modes
+
+def iter_yaml_blocks(file_path):
+    """Stripped task blocks of a YAML pool, read a line at a time"""
+    lines = []
+    with open(file_path, 'r') as f:
+        for line in f:
+            if line.strip():
+                lines.append(line)
+            elif lines:
+                yield ''.join(lines).strip()
+                lines = []
+    if lines:
+        yield ''.join(lines).strip()
+
+def mode_table_path(yaml_path):
+    """Mode table that belongs to a YAML pool or task set"""
+    return Path(yaml_path).with_suffix(MODE_TABLE_SUFFIX)
+
+def load_mode_table(table_path):
+    """Lines of a mode table, one per task, or None if there is none"""
+    try:
+        with open(table_path, 'r') as f:
+            return f.read().splitlines()
+    except FileNotFoundError:
+        return None
+
+def mode_cpus(work, span, period):
+    """CPUs one core type needs for a mode by its YAML times, 0 without work and -1 if the span does not fit"""
+    if work == 0:
+        return 0
+    if span >= period:
+        return -1
+    return math.ceil(max(work - span, 0) / (period - span))
+
+def task_signature(modes, period_quantum=PERIOD_QUANTUM_NS):
+    """
+    Canonical signature of a task from its (work, span, gpu_work, gpu_span,
+    period) mode records: the sorted (cpus_a, cpus_b, quantized period) of
+    its modes. Tasks with the same signature are duplicates or near-duplicates.
+    """
+    return tuple(sorted((mode_cpus(work, span, period), mode_cpus(gpu_work, gpu_span, period), period // period_quantum)
+                        for work, span, gpu_work, gpu_span, period in modes))
+
+class SignatureIndex:
+    """Hashed task signatures of a pool: the signature of every task and the first task with each signature"""
+
+    def __init__(self, period_quantum=PERIOD_QUANTUM_NS):
+        self.period_quantum = period_quantum
+        self.signatures = []
+        self.first = {}
+
+    @classmethod
+    def from_pool(cls, pool, period_quantum=PERIOD_QUANTUM_NS):
+        """Index a BinaryPool or a list of YAML task blocks"""
+        index = cls(period_quantum)
+        for i in range(len(pool)):
+            index.add(pool.modes(i) if isinstance(pool, BinaryPool) else parse_block(pool[i])[1])
+        return index
+
+    def add(self, modes):
+        """Add the next task of the pool; True if no earlier task has its signature"""
+        signature = task_signature(modes, self.period_quantum)
+        self.signatures.append(signature)
+        return self.first.setdefault(signature, len(self.signatures) - 1) == len(self.signatures) - 1
+
+    def __contains__(self, modes):
+        return task_signature(modes, self.period_quantum) in self.first
+
+    def __len__(self):
+        """Number of distinct signatures"""
+        return len(self.first)
+
+def _open_uniform(rng):
+    """Uniform draw in (0, 1), safe to take the log of"""
+    u = rng.random()
+    while u == 0.0:
+        u = rng.random()
+    return u
+
+def sample_yaml_blocks(file_path, k, rng):
+    """
+    Pick k task blocks of a YAML pool uniformly at random in one pass, with
+    O(k) memory: reservoir sampling with Algorithm L's geometric skips over
+    the memory-mapped file, so only the blocks that enter the reservoir are
+    decoded. Blocks are split on blank lines as selector.load_task_blocks
+    splits them. rng is a random.Random (or the random module) and fixes the
+    result. Returns the (pool index, stripped block) pairs in reservoir order
+    and the number of blocks in the pool.
+    """
+    reservoir = []
+    with open(file_path, 'rb') as f:
+        if os.fstat(f.fileno()).st_size == 0:
+            return reservoir, 0
+        data = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+
+    try:
+        size = len(data)
+        weight = 1.0
+        # Index of the next block to keep; the first k are always kept
+        next_pick = 0 if k > 0 else None
+        index = 0
+
+        pos = 0
+        while True:
+            # Start of the next block: past any blank lines
+            while pos < size and data[pos:pos + 1].isspace():
+                pos += 1
+            if pos >= size:
+                break
+            end = data.find(b'\n\n', pos)
+            if end < 0:
+                end = size
+
+            if index == next_pick:
+                block = data[pos:end].decode().strip()
+                if index < k:
+                    reservoir.append((index, block))
+                else:
+                    reservoir[int(rng.random() * k)] = (index, block)
+
+                if index >= k - 1:
+                    # W shrinks by U^(1/k) per kept block; the gap to the next one is geometric in 1 - W
+                    weight *= math.exp(math.log(_open_uniform(rng)) / k)
+                    skip = math.floor(math.log(_open_uniform(rng)) / math.log1p(-weight)) if weight < 1.0 else 0
+                    next_pick = index + skip + 1
+                else:
+                    next_pick = index + 1
+
+            index += 1
+            pos = end
+    finally:
+        data.close()
+
+    return reservoir, index
+
+class PoolWriter:
+    """Appends tasks to a binary pool file; the index and header are written on close"""
+
+    def __init__(self, file_path):
+        self.file = open(file_path, 'wb')
+        self.file.write(HEADER.pack(MAGIC, 0, 0, 0))
+        self.offsets = [0]
+        self.elasticities = []
+
+    def add(self, elasticity, modes):
+        for mode in modes:
+            self.file.write(MODE_RECORD.pack(*mode))
+        self.offsets.append(self.offsets[-1] + len(modes))
+        self.elasticities.append(elasticity)
+
+    def close(self):
+        if self.file.closed:
+            return
+
+        index_offset = self.file.tell()
+        self.file.write(struct.pack(f'<{len(self.offsets)}Q', *self.offsets))
+        self.file.write(struct.pack(f'<{len(self.elasticities)}Q', *self.elasticities))
+
+        self.file.seek(0)
+        self.file.write(HEADER.pack(MAGIC, len(self.elasticities), self.offsets[-1], index_offset))
+        self.file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+class BinaryPool(Sequence):
+    """
+    A memory-mapped binary pool. Indexing renders one task's YAML block, so
+    random.sample(pool, k) only reads and formats the k tasks it picks.
+    """
+
+    def __init__(self, file_path):
+        with open(file_path, 'rb') as f:
+            self.map = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+
+        magic, self.num_tasks, self.num_modes, index_offset = HEADER.unpack_from(self.map, 0)
+        if magic != MAGIC:
+            raise ValueError(f"{file_path} is not a binary task pool")
+
+        self.offsets_at = index_offset
+        self.elasticity_at = index_offset + (self.num_tasks + 1) * OFFSET.size
+
+    def __len__(self):
+        return self.num_tasks
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            return [self[i] for i in range(*index.indices(self.num_tasks))]
+        return render_block(self.elasticity(index), self.modes(index))
+
+    def _task_index(self, index):
+        if index < 0:
+            index += self.num_tasks
+        if not 0 <= index < self.num_tasks:
+            raise IndexError("pool index out of range")
+        return index
+
+    def elasticity(self, index):
+        index = self._task_index(index)
+        return OFFSET.unpack_from(self.map, self.elasticity_at + index * OFFSET.size)[0]
+
+    def modes(self, index):
+        """(work, span, gpu_work, gpu_span, period) in ns for each mode of a task"""
+        index = self._task_index(index)
+        start, end = struct.unpack_from('<2Q', self.map, self.offsets_at + index * OFFSET.size)
+        return list(MODE_RECORD.iter_unpack(self.map[HEADER.size + start * MODE_RECORD.size:HEADER.size + end * MODE_RECORD.size]))
+
+    def close(self):
+        self.map.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+def convert_yaml_pool(yaml_path, pool_path):
+    """
+    Write the binary pool for a YAML pool and return the number of tasks.
+    Raises ValueError if a block would not render back to the same text.
+    """
+    count = 0
+    with PoolWriter(pool_path) as writer:
+        for block in iter_yaml_blocks(yaml_path):
+            elasticity, modes = parse_block(block)
+            if render_block(elasticity, modes) != block:
+                raise ValueError(f"Task {count + 1} in {yaml_path} does not match the pool block format")
+            writer.add(elasticity, modes)
+            count += 1
+    return count
+
+def main():
+    parser = argparse.ArgumentParser(description='Convert YAML task pools to memory-mapped binary pools.')
+    parser.add_argument('yaml_files', nargs='+', help='YAML pools written by gen.py')
+    parser.add_argument('--output_dir', type=str, default=None, help='Directory for the .pool files (default: next to each YAML file)')
+
+    args = parser.parse_args()
+
+    for yaml_file in args.yaml_files:
+        yaml_path = Path(yaml_file)
+        output_dir = Path(args.output_dir) if args.output_dir else yaml_path.parent
+        pool_path = output_dir / yaml_path.with_suffix('.pool').name
+
+        try:
+            count = convert_yaml_pool(yaml_path, pool_path)
+            print(f"Converted {count} tasks from {yaml_path} to {pool_path}")
+        except Exception as e:
+            print(f"Error converting {yaml_path}: {e}")
+
+if __name__ == "__main__":
+    main()
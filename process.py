@@ -1,14 +1,27 @@
-import sys
+import argparse
+import json
+import os
 from pathlib import Path
 from collections import defaultdict
+from concurrent.futures import ProcessPoolExecutor
 import re
 
+import instrument
+from scrape import loss_file_name, parse_loss_values, write_loss_file
+
+# Sidecar file in each processed directory holding the partial statistics of every value file
+CACHE_FILE = '.process_cache.json'
+
 class FileStats:
     def __init__(self):
         self.positive_sum = 0.0
         self.positive_count = 0
         self.negative_one_count = 0
 
+    def add_values(self, values):
+        for value in values:
+            self.add_value(value)
+
     def add_value(self, value):
         if value > 0:
             self.positive_sum += value
@@ -16,6 +29,23 @@ class FileStats:
         elif value == -1:
             self.negative_one_count += 1
 
+    def merge(self, other):
+        self.positive_sum += other.positive_sum
+        self.positive_count += other.positive_count
+        self.negative_one_count += other.negative_one_count
+
+    def to_dict(self):
+        return {'positive_sum': self.positive_sum, 'positive_count': self.positive_count,
+                'negative_one_count': self.negative_one_count}
+
+    @classmethod
+    def from_dict(cls, partial):
+        stats = cls()
+        stats.positive_sum = partial['positive_sum']
+        stats.positive_count = partial['positive_count']
+        stats.negative_one_count = partial['negative_one_count']
+        return stats
+
     @property
     def average_positive(self):
         return self.positive_sum / self.positive_count if self.positive_count > 0 else 0
@@ -24,10 +54,63 @@ def get_base_name(filename):
     """Extract base name from file by removing _i_.log or _e_.log"""
     return re.sub(r'_[ie]_\.log$', '', filename)
 
-def process_directory(directory):
+def read_value_file(file_path):
+    """Statistics of one value file and whether it could be read to the end"""
+    stats = FileStats()
+    try:
+        with open(file_path, 'r') as f:
+            for line in f:
+                try:
+                    value = float(line.strip())
+                    stats.add_value(value)
+                except ValueError:
+                    print(f"Warning: Invalid number in {file_path.name}: {line.strip()}")
+    except Exception as e:
+        print(f"Error processing {file_path.name}: {str(e)}")
+        return stats, False
+    return stats, True
+
+def load_cache(dir_path):
+    """Cached partial statistics of a directory's value files, keyed by file name"""
+    try:
+        with open(dir_path / CACHE_FILE, 'r') as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {}
+
+def save_cache(dir_path, cache):
+    """Replace the cache file in one step so an interrupted run never leaves half of it behind"""
+    temp_path = dir_path / (CACHE_FILE + '.tmp')
+    try:
+        with open(temp_path, 'w') as f:
+            json.dump(cache, f)
+        os.replace(temp_path, dir_path / CACHE_FILE)
+    except OSError as e:
+        print(f"Warning: could not write {dir_path / CACHE_FILE}: {e}")
+
+def cached_file_stats(file_path, cache, new_cache):
+    """
+    Statistics of a value file, taken from cache while its size and mtime are
+    unchanged and parsed otherwise; the entry to keep goes into new_cache
+    """
+    stat = file_path.stat()
+    entry = cache.get(file_path.name)
+    if entry is not None and entry['size'] == stat.st_size and entry['mtime_ns'] == stat.st_mtime_ns:
+        new_cache[file_path.name] = entry
+        return FileStats.from_dict(entry)
+
+    stats, complete = read_value_file(file_path)
+    if complete:
+        new_cache[file_path.name] = dict(size=stat.st_size, mtime_ns=stat.st_mtime_ns, **stats.to_dict())
+    return stats
+
+def process_directory(directory, use_cache=True, timings=instrument.NULL_TIMINGS):
     """
     Process all matching pairs of _i_.log and _e_.log files in directory
     and calculate statistics for each type
+
+    The statistics of each file are kept in the CACHE_FILE sidecar keyed by
+    name, size and mtime, so a re-run only parses new or changed files.
     """
     dir_path = Path(directory)
     if not dir_path.is_dir():
@@ -42,39 +125,88 @@ def process_directory(directory):
         file_groups[base_name][suffix] = file_path
 
     # Initialize statistics for each type
-    i_stats = FileStats()
-    e_stats = FileStats()
+    stats = {'_i_': FileStats(), '_e_': FileStats()}
+
+    with timings.stage('load_cache'):
+        cache = load_cache(dir_path) if use_cache else {}
+    new_cache = {}
 
     # Process each group of files
-    for base_name, files in file_groups.items():
-        print(f"\nProcessing files for base name: {base_name}")
-
-        # Process _i_.log file
-        if '_i_' in files:
-            try:
-                with open(files['_i_'], 'r') as f:
-                    for line in f:
-                        try:
-                            value = float(line.strip())
-                            i_stats.add_value(value)
-                        except ValueError:
-                            print(f"Warning: Invalid number in {files['_i_'].name}: {line.strip()}")
-            except Exception as e:
-                print(f"Error processing {files['_i_'].name}: {str(e)}")
-
-        # Process _e_.log file
-        if '_e_' in files:
-            try:
-                with open(files['_e_'], 'r') as f:
-                    for line in f:
-                        try:
-                            value = float(line.strip())
-                            e_stats.add_value(value)
-                        except ValueError:
-                            print(f"Warning: Invalid number in {files['_e_'].name}: {line.strip()}")
-            except Exception as e:
-                print(f"Error processing {files['_e_'].name}: {str(e)}")
+    with timings.stage('aggregate'):
+        for base_name, files in file_groups.items():
+            print(f"\nProcessing files for base name: {base_name}")
+
+            # Process the _i_.log file, then the _e_.log file
+            for suffix in ('_i_', '_e_'):
+                if suffix in files:
+                    if use_cache:
+                        stats[suffix].merge(cached_file_stats(files[suffix], cache, new_cache))
+                    else:
+                        stats[suffix].merge(read_value_file(files[suffix])[0])
+    timings.count('aggregate', sum(len(files) for files in file_groups.values()), 'files')
+
+    if use_cache and new_cache != cache:
+        with timings.stage('save_cache'):
+            save_cache(dir_path, new_cache)
 
+    i_stats, e_stats = stats['_i_'], stats['_e_']
+    return report_stats(i_stats, e_stats)
+
+def process_logs(log_dir, output_dir=None, workers=None, timings=instrument.NULL_TIMINGS):
+    """
+    Scrape the stderr logs in log_dir straight into the _i_ and _e_ statistics,
+    without scrape.py's intermediate value files. Logs are grouped the way
+    process_directory groups the files scrape.py would write for them, and
+    parsed across a pool of worker processes (1 parses in this process).
+    The value files are only written when output_dir is given.
+    """
+    log_path = Path(log_dir)
+    if not log_path.is_dir():
+        print(f"Error: {log_dir} is not a directory")
+        return
+
+    # Group logs by the base name of the file scrape.py would write for them
+    file_groups = defaultdict(dict)
+    for stderr_file in sorted(log_path.glob('*stderr*')):
+        output_name = loss_file_name(stderr_file.name)
+        if not re.search(r'_[ie]_\.log$', output_name):
+            continue
+        base_name = get_base_name(output_name)
+        suffix = '_i_' if '_i_' in output_name else '_e_'
+        file_groups[base_name][suffix] = stderr_file
+
+    if output_dir:
+        Path(output_dir).mkdir(parents=True, exist_ok=True)
+
+    # Initialize statistics for each type
+    stats = {'_i_': FileStats(), '_e_': FileStats()}
+
+    jobs = [(base_name, suffix, files[suffix]) for base_name, files in file_groups.items() for suffix in ('_i_', '_e_') if suffix in files]
+    executor = ProcessPoolExecutor(max_workers=workers) if workers != 1 else None
+    log_files = [stderr_file for _, _, stderr_file in jobs]
+    parsed = executor.map(parse_loss_values, log_files, chunksize=8) if executor else map(parse_loss_values, log_files)
+
+    try:
+        with timings.stage('scrape'):
+            current = None
+            for (base_name, suffix, stderr_file), values in zip(jobs, parsed):
+                if base_name != current:
+                    print(f"\nProcessing files for base name: {base_name}")
+                    current = base_name
+
+                stats[suffix].add_values(values)
+                if output_dir:
+                    write_loss_file(values, Path(output_dir) / loss_file_name(stderr_file.name), stderr_file.name)
+        timings.count('scrape', len(log_files), 'files')
+        timings.count('scrape', sum(log_file.stat().st_size for log_file in log_files) / 1e6, 'MB')
+    finally:
+        if executor:
+            executor.shutdown()
+
+    return report_stats(stats['_i_'], stats['_e_'])
+
+def report_stats(i_stats, e_stats):
+    """Print the averages and -1 counts of both types and return them"""
     # Print results
     print("\nResults:")
     print("\n_i_.log files:")
@@ -100,9 +232,18 @@ def process_directory(directory):
     }
 
 if __name__ == "__main__":
-    if len(sys.argv) != 2:
-        print("Usage: python script.py <directory_path>")
-        sys.exit(1)
-    
-    directory_path = sys.argv[1]
-    process_directory(directory_path)
\ No newline at end of file
+    parser = argparse.ArgumentParser(description="Average the loss values of _i_ and _e_ runs")
+    parser.add_argument("directory_path", help="Directory of _i_.log/_e_.log value files, or of stderr logs with --logs")
+    parser.add_argument("--logs", action="store_true", help="Read the scheduler stderr logs directly instead of scrape.py output")
+    parser.add_argument("--no-cache", action="store_true", help=f"Parse every value file again and leave {CACHE_FILE} alone")
+    parser.add_argument("-o", "--output-dir", help="With --logs, also write scrape.py's value files here")
+    parser.add_argument("-j", "--workers", type=int, default=None, help="With --logs, number of worker processes (default: one per CPU)")
+    instrument.add_arguments(parser)
+
+    args = parser.parse_args()
+
+    timings = instrument.start('process.py', args.profile, args.timings)
+    if args.logs:
+        process_logs(args.directory_path, args.output_dir, args.workers, timings)
+    else:
+        process_directory(args.directory_path, not args.no_cache, timings)
\ No newline at end of file
@@ -0,0 +1,163 @@
+#!/usr/bin/env python3
+
+"""
+Local stand-in for the elastic scheduler.
+
+Reads task sets written by selector.py (or gen.py's YAML output), picks one
+mode per task so the CPUs of each core type fit the platform, and reports
+the smallest loss the way the scheduler does on stderr:
+
+    Total Loss from Mode Change: 12.345678
+    Error: System is not schedulable in any configuration with specified constraints. Not updating modes.
+
+so scrape.py and process.py read its logs unchanged.
+
+A mode needs the CPUs gen.py computed for it. They are read from the set's
+mode table (<set>.modes.jsonl, see pool.py) when it has one line per task,
+and otherwise recomputed with gen.calculate_cpus: ceil((work - span) /
+(period / 2 - span)) per core type, with the whole period for isofunctional
+tasks (every mode has work on one core type only). A mode gen.py could not
+size is unusable. This is the generator's model and not selector.py's
+pre-screen, which uses the whole period for every task and so counts about
+half as many CPUs. The loss of running a task in a mode is the elastic loss
+(U_max - U)^2 / elasticity, where U = (work + gpu_work) / period and U_max
+is the largest U over the task's modes; the set's loss is the sum over its
+tasks. The smallest total comes from a multiple-choice knapsack over the
+(cpus_a, cpus_b) capacity grid, one vectorized update per mode.
+
+This model is an approximation of the real scheduler: use it to run sweeps
+end to end and keep the real tool for spot checks.
+"""
+
+import argparse
+import json
+import sys
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+
+import instrument
+from gen import calculate_cpus
+from pool import iter_yaml_blocks, load_mode_table, mode_table_path, parse_block
+from scrape import ERROR_MESSAGE
+
+LOSS_LINE = "Total Loss from Mode Change: {:.6f}"
+
+def load_task_set(file_path):
+    """
+    (elasticity, mode records, mode table line) of every task in a YAML task
+    set; the table lines are None unless the set has a mode table with one
+    line per task
+    """
+    tasks = [parse_block(block) for block in iter_yaml_blocks(file_path) if 'elasticity:' in block]
+    table = load_mode_table(mode_table_path(file_path))
+    if table is None or len(table) != len(tasks):
+        table = [None] * len(tasks)
+    return [(elasticity, modes, line) for (elasticity, modes), line in zip(tasks, table)]
+
+def generator_cpus(modes):
+    """cpus_a and cpus_b of every mode by gen.calculate_cpus, -1 where it gives none"""
+    skewness_ratio = 1.0 if all(work == 0 or gpu_work == 0 for work, _, gpu_work, _, _ in modes) else None
+    cpus = [(calculate_cpus(work, span, period, skewness_ratio), calculate_cpus(gpu_work, gpu_span, period, skewness_ratio))
+            for work, span, gpu_work, gpu_span, period in modes]
+    cpus_a = np.array([-1 if a is None else a for a, _ in cpus], dtype=np.int64)
+    cpus_b = np.array([-1 if b is None else b for _, b in cpus], dtype=np.int64)
+    return cpus_a, cpus_b
+
+def table_cpus(line, num_modes):
+    """cpus_a and cpus_b of every mode from a mode table line; modes it does not list need -1"""
+    cpus_a = np.full(num_modes, -1, dtype=np.int64)
+    cpus_b = np.full(num_modes, -1, dtype=np.int64)
+    for entry in json.loads(line)['modes']:
+        cpus_a[entry['mode']], cpus_b[entry['mode']] = entry['cpus_a'], entry['cpus_b']
+    return cpus_a, cpus_b
+
+def mode_demands(elasticity, modes, table_line=None):
+    """Per-mode cpus_a, cpus_b and elastic loss of one task; unusable modes need -1 CPUs"""
+    cpus_a, cpus_b = generator_cpus(modes) if table_line is None else table_cpus(table_line, len(modes))
+    cpus_a[cpus_b < 0] = -1
+    cpus_b[cpus_a < 0] = -1
+
+    utilization = np.array([(work + gpu_work) / period for work, _, gpu_work, _, period in modes])
+    loss = (utilization.max(initial=0) - utilization) ** 2 / elasticity
+    return cpus_a, cpus_b, loss
+
+def schedule_task_set(tasks, cpus_a, cpus_b):
+    """
+    Smallest total loss of running every task (as load_task_set gives them) in one of its modes on cpus_a
+    type A and cpus_b type B CPUs, and the chosen mode index of each task;
+    (None, None) if no choice fits.
+
+    best[a, b] is the smallest loss of the tasks so far using exactly a type A
+    and b type B CPUs. Each mode shifts the whole grid by its demand, so a task
+    costs one array minimum per usable mode.
+    """
+    best = np.full((cpus_a + 1, cpus_b + 1), np.inf)
+    best[0, 0] = 0.0
+    demands = [mode_demands(*task) for task in tasks]
+    choices = []
+
+    for need_a, need_b, loss in demands:
+        step = np.full_like(best, np.inf)
+        choice = np.full(best.shape, -1, dtype=np.int32)
+        for mode in np.flatnonzero((need_a >= 0) & (need_a <= cpus_a) & (need_b >= 0) & (need_b <= cpus_b)):
+            a, b = need_a[mode], need_b[mode]
+            candidate = best[:cpus_a + 1 - a, :cpus_b + 1 - b] + loss[mode]
+            target = step[a:, b:]
+            better = candidate < target
+            target[better] = candidate[better]
+            choice[a:, b:][better] = mode
+        best = step
+        choices.append(choice)
+
+    position = np.unravel_index(np.argmin(best), best.shape)
+    if not np.isfinite(best[position]):
+        return None, None
+
+    # Walk the choices back from the best final cell
+    a, b = position
+    chosen = []
+    for (need_a, need_b, _), choice in zip(reversed(demands), reversed(choices)):
+        mode = int(choice[a, b])
+        chosen.append(mode)
+        a, b = a - need_a[mode], b - need_b[mode]
+    return float(best[position]), chosen[::-1]
+
+def schedule_file(file_path, cpus_a, cpus_b):
+    """The scheduler's result line for one task set file"""
+    loss, _ = schedule_task_set(load_task_set(file_path), cpus_a, cpus_b)
+    return ERROR_MESSAGE.decode() if loss is None else LOSS_LINE.format(loss)
+
+def schedule_files(file_paths, cpus_a, cpus_b, workers=None):
+    """Result lines of every task set file, in order, computed across workers processes (1 computes here)"""
+    if workers == 1:
+        return [schedule_file(file_path, cpus_a, cpus_b) for file_path in file_paths]
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        return list(executor.map(schedule_file, file_paths, [cpus_a] * len(file_paths), [cpus_b] * len(file_paths), chunksize=16))
+
+def main():
+    parser = argparse.ArgumentParser(description='Score task sets with a local stand-in for the elastic scheduler.')
+    parser.add_argument('task_sets', nargs='+', help='YAML task sets written by selector.py or gen.py')
+    parser.add_argument('--cpus', type=int, nargs=2, metavar=('CPUS_A', 'CPUS_B'), required=True,
+                        help='type A and type B CPUs of the platform')
+    parser.add_argument('-o', '--log', default=None, help='append the result lines to this file instead of writing them to stderr')
+    parser.add_argument('-j', '--workers', type=int, default=1, help='number of worker processes (default 1: none)')
+    instrument.add_arguments(parser)
+
+    args = parser.parse_args()
+    if min(args.cpus) < 0:
+        parser.error('--cpus must not be negative')
+    timings = instrument.start('schedule.py', args.profile, args.timings)
+
+    with timings.stage('schedule'):
+        lines = schedule_files(args.task_sets, *args.cpus, args.workers)
+    timings.count('schedule', len(lines), 'sets')
+
+    if args.log:
+        with open(args.log, 'a') as f:
+            f.write(''.join(line + '\n' for line in lines))
+    else:
+        sys.stderr.write(''.join(line + '\n' for line in lines))
+
+if __name__ == "__main__":
+    main()
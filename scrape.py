@@ -1,10 +1,25 @@
+import mmap
 import re
 import sys
+from concurrent.futures import ProcessPoolExecutor
 from pathlib import Path
 
+import instrument
+
+LOSS_PATTERN = re.compile(rb"Total Loss from Mode Change: ([-+]?\d*\.?\d+)")
+ERROR_MESSAGE = b"Error: System is not schedulable in any configuration with specified constraints. Not updating modes."
+
+# Byte markers that every loss or error line contains; only lines holding one are matched
+LOSS_MARKER = b"Total Loss"
+ERROR_MARKER = b"Error:"
+
 def parse_loss_values(file_path):
     """
     Parse log files to extract total loss values and convert error messages to -1.
+
+    The file is memory-mapped and searched for the "Total Loss" and "Error:"
+    markers; only the lines containing one are checked against the error
+    message and the loss pattern.
     
     Args:
         file_path (str): Path to the log file
@@ -12,22 +27,43 @@ def parse_loss_values(file_path):
     Returns:
         list: List of numbers representing loss values or -1 for errors
     """
-    loss_pattern = r"Total Loss from Mode Change: ([-+]?\d*\.?\d+)"
-    error_message = "Error: System is not schedulable in any configuration with specified constraints. Not updating modes."
-    
     results = []
     
     try:
-        with open(file_path, 'r') as file:
-            for line in file:
-                if error_message in line:
-                    results.append(-1)
-                    continue
-                
-                match = re.search(loss_pattern, line)
-                if match:
-                    value = float(match.group(1))
-                    results.append(value)
+        with open(file_path, 'rb') as file:
+            if Path(file_path).stat().st_size == 0:
+                return []
+
+            with mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ) as data:
+                # Next occurrence of each marker at or after position (-1 once there is none);
+                # a marker is only searched for again after its last hit has been passed
+                position = 0
+                hits = {marker: data.find(marker) for marker in (LOSS_MARKER, ERROR_MARKER)}
+                while True:
+                    for marker, hit in hits.items():
+                        if 0 <= hit < position:
+                            hits[marker] = data.find(marker, position)
+
+                    found = [hit for hit in hits.values() if hit >= 0]
+                    if not found:
+                        break
+
+                    # The line holding the earliest marker is the next candidate
+                    start = data.rfind(b"\n", 0, min(found)) + 1
+                    end = data.find(b"\n", min(found))
+                    if end < 0:
+                        end = len(data)
+                    line = data[start:end]
+                    position = end + 1
+
+                    if ERROR_MESSAGE in line:
+                        results.append(-1)
+                        continue
+
+                    match = LOSS_PATTERN.search(line)
+                    if match:
+                        value = float(match.group(1))
+                        results.append(value)
     
     except FileNotFoundError:
         print(f"Error: File {file_path} not found")
@@ -38,14 +74,19 @@ def parse_loss_values(file_path):
         
     return results
 
-def process_directory(input_dir, output_dir=None):
+def process_directory(input_dir, output_dir=None, workers=None, timings=instrument.NULL_TIMINGS):
     """
     Process all files in directory containing 'stderr' in their name
     and write results to new files with 'stderr' removed from name.
+
+    Files are parsed across a pool of worker processes and written in name
+    order, so the output does not depend on the worker count.
     
     Args:
         input_dir (str): Path to directory containing stderr files
         output_dir (str, optional): Path to directory for output files
+        workers (int, optional): Number of worker processes (default: one per CPU, 1 parses in this process)
+        timings (instrument.Timings, optional): Records the scrape and write stages
     """
     input_path = Path(input_dir)
     if not input_path.is_dir():
@@ -61,7 +102,7 @@ def process_directory(input_dir, output_dir=None):
         output_path = input_path
 
     # Find all files with 'stderr' in the name
-    stderr_files = list(input_path.glob('*stderr*'))
+    stderr_files = sorted(input_path.glob('*stderr*'))
     if not stderr_files:
         print(f"No files containing 'stderr' found in {input_dir}")
         return
@@ -69,28 +110,45 @@ def process_directory(input_dir, output_dir=None):
     print(f"\nProcessing files from: {input_path}")
     print(f"Writing output to: {output_path}")
 
-    for stderr_file in stderr_files:
+    executor = ProcessPoolExecutor(max_workers=workers) if workers != 1 else None
+    parsed = executor.map(parse_loss_values, stderr_files, chunksize=8) if executor else map(parse_loss_values, stderr_files)
+
+    try:
+        with timings.stage('scrape'):
+            write_loss_files(stderr_files, parsed, output_path, timings)
+        timings.count('scrape', len(stderr_files), 'files')
+        timings.count('scrape', sum(stderr_file.stat().st_size for stderr_file in stderr_files) / 1e6, 'MB')
+    finally:
+        if executor:
+            executor.shutdown()
+
+def write_loss_files(stderr_files, parsed, output_path, timings=instrument.NULL_TIMINGS):
+    """Write the values parsed from each stderr file to its output file, in file order"""
+    for stderr_file, values in zip(stderr_files, parsed):
         print(f"\nProcessing {stderr_file.name}...")
-        
-        # Create output filename by removing 'stderr'
-        output_name = stderr_file.name.replace('stderr', '')
-        if output_name == stderr_file.name:  # If 'stderr' wasn't found or removed
-            output_name = f"processed_{stderr_file.name}"
-        output_file = output_path / output_name
-        
-        # Process the file
-        values = parse_loss_values(stderr_file)
-        
-        if values:  # Only write if we got some values
-            try:
-                with open(output_file, 'w') as f:
-                    for value in values:
-                        f.write(f"{value}\n")
-                print(f"Wrote {len(values)} values to {output_file}")
-            except Exception as e:
-                print(f"Error writing to {output_file}: {str(e)}")
-        else:
-            print(f"No values found in {stderr_file.name}")
+        with timings.stage('write'):
+            write_loss_file(values, output_path / loss_file_name(stderr_file.name), stderr_file.name)
+        timings.count('write', len(values), 'lines')
+
+def loss_file_name(stderr_name):
+    """Name of the values file for a stderr file: the same name with 'stderr' removed"""
+    output_name = stderr_name.replace('stderr', '')
+    if output_name == stderr_name:  # If 'stderr' wasn't found or removed
+        output_name = f"processed_{stderr_name}"
+    return output_name
+
+def write_loss_file(values, output_file, stderr_name):
+    """Write one value per line; nothing is written when there are no values"""
+    if values:  # Only write if we got some values
+        try:
+            with open(output_file, 'w') as f:
+                for value in values:
+                    f.write(f"{value}\n")
+            print(f"Wrote {len(values)} values to {output_file}")
+        except Exception as e:
+            print(f"Error writing to {output_file}: {str(e)}")
+    else:
+        print(f"No values found in {stderr_name}")
 
 if __name__ == "__main__":
     import argparse
@@ -98,7 +156,10 @@ if __name__ == "__main__":
     parser = argparse.ArgumentParser(description="Process stderr files and extract loss values")
     parser.add_argument("input_dir", help="Directory containing stderr files to process")
     parser.add_argument("-o", "--output-dir", help="Directory for output files (optional)")
+    parser.add_argument("-j", "--workers", type=int, default=None, help="Number of worker processes (default: one per CPU)")
+    instrument.add_arguments(parser)
     
     args = parser.parse_args()
-    
-    process_directory(args.input_dir, args.output_dir)
\ No newline at end of file
+
+    timings = instrument.start('scrape.py', args.profile, args.timings)
+    process_directory(args.input_dir, args.output_dir, args.workers, timings)
\ No newline at end of file
@@ -3,7 +3,16 @@
 import random
 import argparse
 import re
-from typing import List
+import sys
+from collections import Counter
+from pathlib import Path
+from typing import Dict, List, Optional, Sequence
+
+import numpy as np
+
+import instrument
+import serve
+from pool import BinaryPool, SignatureIndex, load_mode_table, mode_table_path, parse_block, sample_yaml_blocks
 
 HEADER = """--- 
 schedulable: true
@@ -12,6 +21,14 @@ FPTAS: false
 maxRuntime: {sec: 5, nsec: 0}
 tasks:"""
 
+# Pool file for each task category; 'light' currently reuses the workload pool
+POOL_FILES = {
+    'iso': '3000s/3000-isofunctional-elastic.yaml',
+    'comb': '3000s/3000-comb-elastic.yaml',
+    'workload': '3000s/3000-workload-elastic.yaml',
+    'light': '3000s/3000-workload-elastic.yaml'
+}
+
 def load_task_blocks(file_path: str) -> List[str]:
     """Load task blocks from file, separated by double newlines."""
     try:
@@ -22,12 +39,181 @@ def load_task_blocks(file_path: str) -> List[str]:
         print(f"Error loading {file_path}: {e}")
         return []
 
-def select_random_tasks(tasks: List[str], count: int) -> List[str]:
+def load_binary_pool(file_path: str) -> Sequence[str]:
+    """Open the memory-mapped .pool file next to a YAML pool; blocks are rendered on access."""
+    pool_path = Path(file_path).with_suffix('.pool')
+    try:
+        return BinaryPool(pool_path)
+    except Exception as e:
+        print(f"Error loading {pool_path}: {e}")
+        return []
+
+class StreamedPool(Sequence):
+    """
+    A YAML pool that is never loaded: sample() reads the file once and keeps
+    only the blocks it picks (see pool.sample_yaml_blocks), so memory stays
+    O(count) however large the pool is. Only the sampled indices can be read.
+    """
+
+    def __init__(self, file_path: str):
+        self.file_path = file_path
+        self.blocks = {}
+        self.num_tasks = 0
+
+    def sample(self, count: int) -> List[int]:
+        """Pick count tasks with the random module's state; returns their pool indices"""
+        # Nothing is read for a category with no tasks in the set
+        if count <= 0:
+            self.blocks = {}
+            return []
+        try:
+            reservoir, self.num_tasks = sample_yaml_blocks(self.file_path, count, random)
+        except Exception as e:
+            print(f"Error loading {self.file_path}: {e}")
+            reservoir, self.num_tasks = [], 0
+        self.blocks = dict(reservoir)
+        return [index for index, _ in reservoir]
+
+    def __len__(self):
+        return self.num_tasks
+
+    def __getitem__(self, index):
+        if index not in self.blocks:
+            raise IndexError(f"task {index} of {self.file_path} was not sampled")
+        return self.blocks[index]
+
+    def mode_table(self) -> Optional[Dict[int, str]]:
+        """Mode table lines of the sampled tasks, read in one pass, or None if the table does not match the pool"""
+        if not self.blocks:
+            return {} if mode_table_path(self.file_path).exists() else None
+        lines = {}
+        count = 0
+        try:
+            with open(mode_table_path(self.file_path), 'r') as f:
+                for count, line in enumerate(f, 1):
+                    if count - 1 in self.blocks:
+                        lines[count - 1] = line.rstrip('\n')
+        except FileNotFoundError:
+            return None
+        return lines if count == self.num_tasks else None
+
+def load_pools(binary: bool = False, stream: Sequence[str] = ()) -> Dict[str, Sequence[str]]:
+    """
+    Load the pool of every category, reading a file shared by several categories once.
+    The categories in stream get a StreamedPool of their own instead.
+    """
+    loaded = {}
+    pools = {}
+    for category, file_path in POOL_FILES.items():
+        if category in stream:
+            pools[category] = StreamedPool(file_path)
+            continue
+        if file_path not in loaded:
+            loaded[file_path] = load_binary_pool(file_path) if binary else load_task_blocks(file_path)
+        pools[category] = loaded[file_path]
+    return pools
+
+def load_mode_tables(pools: Dict[str, Sequence[str]]) -> Dict[str, Optional[List[str]]]:
+    """
+    Mode table lines of every category's pool, or None where gen.py wrote no
+    table or it does not have one line per pool task. Streamed pools only
+    give the lines of their sampled tasks, so they are read after sampling.
+    """
+    loaded = {}
+    tables = {}
+    for category, file_path in POOL_FILES.items():
+        if isinstance(pools[category], StreamedPool):
+            tables[category] = pools[category].mode_table()
+            continue
+        if file_path not in loaded:
+            loaded[file_path] = load_mode_table(mode_table_path(file_path))
+        table = loaded[file_path]
+        tables[category] = table if table is not None and len(table) == len(pools[category]) else None
+    return tables
+
+def select_random_tasks(tasks: Sequence[str], count: int) -> List[str]:
     """Select a specified number of random tasks from the list."""
     if not tasks or count <= 0:
         return []
     return random.sample(tasks, min(count, len(tasks)))
 
+def load_signature_indexes(pools: Dict[str, Sequence[str]]) -> Dict[str, SignatureIndex]:
+    """Signature index of every category's pool, built once per pool file."""
+    loaded = {}
+    indexes = {}
+    for category, file_path in POOL_FILES.items():
+        if file_path not in loaded:
+            loaded[file_path] = SignatureIndex.from_pool(pools[category])
+        indexes[category] = loaded[file_path]
+    return indexes
+
+def select_distinct_tasks(index: SignatureIndex, count: int, used: set) -> List[int]:
+    """
+    Select count random pool indices whose signatures differ from each other
+    and from those in used, adding theirs to used. Draws the same sample as
+    select_random_tasks and replaces each repeated signature with further
+    random picks, so sets without repeats come out unchanged.
+    """
+    available = sum(1 for signature in index.first if signature not in used)
+    if count > available:
+        raise ValueError(f"only {available} distinct signatures left for {count} tasks")
+
+    picked = []
+    for position in select_random_tasks(range(len(index.signatures)), count):
+        while index.signatures[position] in used:
+            position = random.randrange(len(index.signatures))
+        used.add(index.signatures[position])
+        picked.append(position)
+    return picked
+
+def task_modes(tasks: Sequence[str], index: int) -> np.ndarray:
+    """(modes, 5) array of work, span, gpu_work, gpu_span and period in ns for one pool task."""
+    if isinstance(tasks, BinaryPool):
+        modes = tasks.modes(index)
+    else:
+        modes = parse_block(tasks[index])[1]
+    return np.array(modes, dtype=np.float64).reshape(-1, 5)
+
+def prescreen_task_set(task_modes_list: List[np.ndarray], cpus_a: int, cpus_b: int) -> Optional[str]:
+    """
+    Check necessary conditions for a task set to fit on cpus_a type A and
+    cpus_b type B CPUs. Returns the first condition that fails, or None if
+    the set might be schedulable.
+
+    Every task has to run in one of its modes, so the set cannot fit if the
+    smallest demand of each task already adds up to more than the platform,
+    counted per core type and over both types. A mode's CPUs are bounded
+    below by ceil((work - span) / (period - span)) and its utilization by
+    work / period; modes whose span exceeds the period or that need more
+    CPUs than the platform has are never usable.
+    """
+    if not task_modes_list:
+        return None
+
+    modes = np.concatenate(task_modes_list)
+    starts = np.cumsum([0] + [len(task) for task in task_modes_list[:-1]])
+    work, span, gpu_work, gpu_span, period = modes.T
+
+    with np.errstate(divide='ignore', invalid='ignore'):
+        need_a = np.where(work > 0, np.ceil(np.maximum(work - span, 0) / (period - span)), 0)
+        need_b = np.where(gpu_work > 0, np.ceil(np.maximum(gpu_work - gpu_span, 0) / (period - gpu_span)), 0)
+
+    usable = (span < period) & (gpu_span < period) & (need_a <= cpus_a) & (need_b <= cpus_b)
+    if not np.logical_or.reduceat(usable, starts).all():
+        return 'no_usable_mode'
+
+    # Smallest demand of each task over its usable modes, summed over the set
+    least = lambda demand: np.minimum.reduceat(np.where(usable, demand, np.inf), starts).sum()
+
+    for reason, demand, capacity in (('cpus_a', need_a, cpus_a), ('cpus_b', need_b, cpus_b),
+                                     ('total_cpus', need_a + need_b, cpus_a + cpus_b),
+                                     ('utilization_a', work / period, cpus_a), ('utilization_b', gpu_work / period, cpus_b),
+                                     ('total_utilization', (work + gpu_work) / period, cpus_a + cpus_b)):
+        if least(demand) > capacity:
+            return reason
+
+    return None
+
 def modify_task_block(task_block: str) -> str:
     """Modify the name and args fields in a task block."""
     # Replace the name field
@@ -44,57 +230,234 @@ def validate_arguments(args) -> bool:
         return False
     return True
 
-def main():
-    # Set up argument parser
+def selection_seed(num_tasks: int, iso_tasks: int, comb_tasks: int, workload_tasks: int, seed_num: int) -> int:
+    """Python random seed of one composition, from all of its parameters."""
+    return ((seed_num + 1) * 2) * ((iso_tasks + 1) * 3) * ((comb_tasks + 1) * 5) * ((workload_tasks + 1) * 7) * ((num_tasks + 1) * 11)
+
+def category_counts(num_tasks: int, iso_tasks: int, comb_tasks: int, workload_tasks: int) -> List[tuple]:
+    """(category, count) in sampling order; the tasks not given to another category are light."""
+    light_tasks_count = num_tasks - (iso_tasks + comb_tasks + workload_tasks)
+    return [('workload', workload_tasks), ('iso', iso_tasks), ('comb', comb_tasks), ('light', light_tasks_count)]
+
+def select_task_set(task_files: Dict[str, Sequence[str]], counts: List[tuple], prescreen: Optional[Sequence[int]] = None,
+                    max_resamples: int = 100, signature_indexes: Optional[Dict[str, SignatureIndex]] = None,
+                    timings=instrument.NULL_TIMINGS):
+    """
+    Draw a task set from the current random state as (category, pool index)
+    pairs, resampling sets that fail the pre-screen. Returns the set, or None
+    if none passed within max_resamples, and the pre-screen rejections by
+    reason. With signature_indexes no signature repeats in the set; raises
+    ValueError if a pool has too few of them.
+    """
+    rejected = Counter()
+    while True:
+        # Select tasks from each category, as pool indices so the pre-screen can read their modes
+        with timings.stage('sample'):
+            if signature_indexes is not None:
+                used = set()
+                selected = [(category, index) for category, count in counts
+                            for index in select_distinct_tasks(signature_indexes[category], count, used)]
+            else:
+                selected = [(category, index) for category, count in counts
+                            for index in (task_files[category].sample(count) if isinstance(task_files[category], StreamedPool)
+                                          else select_random_tasks(range(len(task_files[category])), count))]
+        timings.count('sample', 1, 'sets')
+
+        if prescreen is None:
+            return selected, rejected
+
+        with timings.stage('prescreen'):
+            reason = prescreen_task_set([task_modes(task_files[category], index) for category, index in selected], *prescreen)
+        timings.count('prescreen', 1, 'sets')
+        if reason is None:
+            return selected, rejected
+
+        rejected[reason] += 1
+        if sum(rejected.values()) > max_resamples:
+            return None, rejected
+
+def render_task_set(task_files: Dict[str, Sequence[str]], selected: List[tuple]) -> str:
+    """The YAML of a composed set, with the name and args of every task replaced."""
+    selected_tasks = [task_files[category][index] for category, index in selected]
+
+    # Modify each task block
+    modified_tasks = [modify_task_block(task) for task in selected_tasks]
+    return HEADER + '\n  ' + '\n\n  '.join(modified_tasks)
+
+def write_task_set(output_file: str, content: str, selected: List[tuple], mode_tables: Dict[str, Optional[List[str]]],
+                   timings=instrument.NULL_TIMINGS, verbose: bool = True) -> bool:
+    """Write a composed set and the mode tables of its tasks; False if the set could not be written."""
+    try:
+        with timings.stage('write'):
+            with open(output_file, 'w') as f:
+                f.write(content)
+        timings.count('write', len(content) / 1e6, 'MB')
+        if verbose:
+            print(f"Successfully wrote {len(selected)} tasks to {output_file}")
+    except Exception as e:
+        print(f"Error writing output file: {e}")
+        return False
+
+    # Carry the precomputed mode tables of the selected tasks over, in the order of the set
+    if any(table is not None for table in mode_tables.values()):
+        missing = sorted({POOL_FILES[category] for category, _ in selected if mode_tables[category] is None})
+        if missing:
+            print(f"Warning: no up-to-date mode table for {', '.join(missing)}; not writing {mode_table_path(output_file)}")
+        else:
+            with timings.stage('write'):
+                with open(mode_table_path(output_file), 'w') as f:
+                    f.write(''.join(mode_tables[category][index] + '\n' for category, index in selected))
+            if verbose:
+                print(f"Wrote the mode tables of the selected tasks to {mode_table_path(output_file)}")
+    return True
+
+def compose_task_set(task_files: Dict[str, Sequence[str]], mode_tables: Dict[str, Optional[List[str]]], num_tasks: int, iso_tasks: int,
+                     comb_tasks: int, workload_tasks: int, seed_num: int, output: str, prescreen: Optional[Sequence[int]] = None,
+                     max_resamples: int = 100, signature_indexes: Optional[Dict[str, SignatureIndex]] = None) -> Optional[str]:
+    """
+    Compose and write one task set from loaded pools, seeded as main() seeds
+    it, so the file is the one selector.py writes for the same arguments.
+    Returns None, or why the set was not written.
+    """
+    random.seed(selection_seed(num_tasks, iso_tasks, comb_tasks, workload_tasks, seed_num))
+    counts = category_counts(num_tasks, iso_tasks, comb_tasks, workload_tasks)
+    try:
+        selected, _ = select_task_set(task_files, counts, prescreen, max_resamples, signature_indexes)
+    except ValueError as e:
+        return str(e)
+    if selected is None:
+        return f"no task set passed the pre-screen after {max_resamples} resamples"
+
+    # Streamed pools only know the mode table lines of the tasks they just sampled
+    mode_tables = {category: pool.mode_table() if isinstance(pool, StreamedPool) else mode_tables[category]
+                   for category, pool in task_files.items()}
+
+    Path(output).parent.mkdir(parents=True, exist_ok=True)
+    if not write_task_set(output, render_task_set(task_files, selected), selected, mode_tables, verbose=False):
+        return "could not be written"
+    return None
+
+# Options every composition needs; with --serve they come with each request instead
+COMPOSITION_ARGUMENTS = ('num_tasks', 'iso_tasks', 'comb_tasks', 'workload_tasks', 'seed_num', 'output')
+
+def build_parser() -> argparse.ArgumentParser:
+    """selector.py's argument parser, shared by the command line and --serve requests"""
     parser = argparse.ArgumentParser(description='Select random task configurations from files.')
-    parser.add_argument('--num_tasks', type=int, required=True, help='Total number of tasks to select')
-    parser.add_argument('--iso_tasks', type=int, required=True, help='Number of isolation tasks')
-    parser.add_argument('--comb_tasks', type=int, required=True, help='Number of combination tasks')
-    parser.add_argument('--workload_tasks', type=int, required=True, help='Number of workload tasks')
-    parser.add_argument('--seed_num', type=int, required=True, help='specifies seed offset: will be appended to file name')
-    parser.add_argument('--output', type=str, required=True, help='output file name')
+    parser.add_argument('--num_tasks', type=int, help='Total number of tasks to select')
+    parser.add_argument('--iso_tasks', type=int, help='Number of isolation tasks')
+    parser.add_argument('--comb_tasks', type=int, help='Number of combination tasks')
+    parser.add_argument('--workload_tasks', type=int, help='Number of workload tasks')
+    parser.add_argument('--seed_num', type=int, help='specifies seed offset: will be appended to file name')
+    parser.add_argument('--output', type=str, help='output file name')
+    parser.add_argument('--binary', action='store_true', help='read the memory-mapped .pool files instead of the YAML pools')
+    parser.add_argument('--prescreen', type=int, nargs=2, metavar=('CPUS_A', 'CPUS_B'), default=None,
+                        help='resample task sets that cannot fit on this many type A and type B CPUs')
+    parser.add_argument('--max_resamples', type=int, default=100, help='give up after this many infeasible sets when pre-screening')
+    parser.add_argument('--distinct', action='store_true', help='never put two tasks with the same signature into a set')
+    parser.add_argument('--stream', nargs='+', choices=list(POOL_FILES), default=[], metavar='CATEGORY',
+                        help='sample these categories by streaming their YAML pool once instead of loading it '
+                             f'({", ".join(POOL_FILES)})')
+    parser.add_argument('--serve', action='store_true',
+                        help='load the pools once and compose the task sets of JSON-line requests (see serve.py)')
+    serve.add_arguments(parser)
+
+    instrument.add_arguments(parser)
+    return parser
+
+def parse_composition(parser: argparse.ArgumentParser, argv: Optional[List[str]] = None) -> argparse.Namespace:
+    """Parse the arguments of one composition; every option in COMPOSITION_ARGUMENTS is required"""
+    args = parser.parse_args(argv)
+    missing = [f"--{name}" for name in COMPOSITION_ARGUMENTS if getattr(args, name) is None]
+    if missing:
+        parser.error(f"the following arguments are required: {', '.join(missing)}")
+    return args
+
+def serve_compositions(parser: argparse.ArgumentParser, args: argparse.Namespace):
+    """
+    --serve: load the pools, mode tables and signature indexes once, then
+    compose the set of every request. A request takes selector.py's
+    composition options; the pool options are the server's.
+    """
+    if args.distinct and args.stream:
+        print("Error: --distinct needs the signatures of whole pools and cannot be combined with --stream")
+        return
+
+    task_files = load_pools(args.binary, args.stream)
+    mode_tables = load_mode_tables(task_files)
+    signature_indexes = load_signature_indexes(task_files) if args.distinct else None
+
+    def run(argv):
+        request = parse_composition(parser, argv)
+        if request.serve or request.socket or request.profile or request.timings:
+            parser.error("--serve, --socket, --profile and --timings apply to the server, not to a request")
+        if (request.binary, request.distinct, request.stream) != (args.binary, args.distinct, args.stream):
+            parser.error("--binary, --distinct and --stream must match the server's")
+        if not validate_arguments(request):
+            sys.exit(1)
 
+        error = compose_task_set(task_files, mode_tables, request.num_tasks, request.iso_tasks, request.comb_tasks,
+                                 request.workload_tasks, request.seed_num, request.output, request.prescreen,
+                                 request.max_resamples, signature_indexes)
+        if error is not None:
+            print(f"Error: {error}; not writing {request.output}")
+            sys.exit(1)
+        return request.output
+
+    serve.serve(run, args.socket)
+
+def main():
+    parser = build_parser()
     args = parser.parse_args()
-    
+    if args.serve:
+        serve_compositions(parser, args)
+        return
+    args = parse_composition(parser)
+
     if not validate_arguments(args):
         return
+    if args.distinct and args.stream:
+        print("Error: --distinct needs the signatures of whole pools and cannot be combined with --stream")
+        return
+
+    timings = instrument.start('selector.py', args.profile, args.timings)
 
     #set python seed
-    random.seed(((args.seed_num + 1) * 2) * ((args.iso_tasks + 1) * 3) * ((args.comb_tasks + 1) * 5) * ((args.workload_tasks + 1) * 7) * ((args.num_tasks + 1) * 11))
+    random.seed(selection_seed(args.num_tasks, args.iso_tasks, args.comb_tasks, args.workload_tasks, args.seed_num))
 
     # Load all task files
-    task_files = {
-        'iso': load_task_blocks('3000s/3000-isofunctional-elastic.yaml'),
-        'comb': load_task_blocks('3000s/3000-comb-elastic.yaml'),
-        'workload': load_task_blocks('3000s/3000-workload-elastic.yaml'),
-        'light': load_task_blocks('3000s/3000-workload-elastic.yaml')
-    }
-
-    # Select tasks from each category
-    selected_tasks = []
-    
-    # Add tasks from each category
-    selected_tasks.extend(select_random_tasks(task_files['workload'], args.workload_tasks))
-    selected_tasks.extend(select_random_tasks(task_files['iso'], args.iso_tasks))
-    selected_tasks.extend(select_random_tasks(task_files['comb'], args.comb_tasks))
-    
-    # Calculate and add light tasks
-    specified_sum = args.iso_tasks + args.comb_tasks + args.workload_tasks
-    light_tasks_count = args.num_tasks - specified_sum
-    selected_tasks.extend(select_random_tasks(task_files['light'], light_tasks_count))
+    with timings.stage('load_pools'):
+        task_files = load_pools(args.binary, args.stream)
+    # Categories sharing a pool file share the loaded pool, which is counted once
+    loaded_pools = {id(pool): pool for pool in task_files.values()}
+    timings.count('load_pools', sum(len(pool) for pool in loaded_pools.values()), 'blocks')
+    signature_indexes = None
+    if args.distinct:
+        with timings.stage('signature_index'):
+            signature_indexes = load_signature_indexes(task_files)
 
-    # Modify each task block
-    modified_tasks = [modify_task_block(task) for task in selected_tasks]
+    counts = category_counts(args.num_tasks, args.iso_tasks, args.comb_tasks, args.workload_tasks)
+    try:
+        selected, rejected = select_task_set(task_files, counts, args.prescreen, args.max_resamples, signature_indexes, timings)
+    except ValueError as e:
+        print(f"Error: {e}; not writing {args.output}")
+        return
+
+    if args.prescreen is not None:
+        summary = ', '.join(f"{reason}: {count}" for reason, count in rejected.items())
+        print(f"Pre-screen rejected {sum(rejected.values())} task sets" + (f" ({summary})" if summary else ""))
+        if selected is None:
+            print(f"Error: no task set passed the pre-screen after {args.max_resamples} resamples; not writing {args.output}")
+            return
+
+    with timings.stage('load_mode_tables'):
+        mode_tables = load_mode_tables(task_files)
+
+    with timings.stage('format'):
+        content = render_task_set(task_files, selected)
+    timings.count('format', len(selected), 'tasks')
 
     # Write the final configuration to a new file
-    output_file = args.output
-    try:
-        with open(output_file, 'w') as f:
-            f.write(HEADER + '\n  ')
-            f.write('\n\n  '.join(modified_tasks))
-        print(f"Successfully wrote {len(modified_tasks)} tasks to {output_file}")
-    except Exception as e:
-        print(f"Error writing output file: {e}")
+    write_task_set(args.output, content, selected, mode_tables, timings)
 
 if __name__ == "__main__":
     main()
@@ -0,0 +1,116 @@
+#!/usr/bin/env python3
+
+"""
+Persistent worker mode shared by selector.py --serve and gen.py serve.
+
+The command loads what it needs once (pools, numpy, ...) and then reads one
+JSON request per line, from stdin or from a local UNIX socket with
+--socket PATH. A request gives the command-line arguments of one run, either
+as a list or as option names:
+
+    {"id": 1, "args": ["--num_tasks", "16", "--iso_tasks", "0", ...]}
+    {"id": 2, "num_tasks": 16, "iso_tasks": 0, "prescreen": [8, 8], ...}
+
+and gets one JSON line back:
+
+    {"id": 1, "ok": true, "output": "out.yaml", "seconds": 0.004}
+    {"id": 2, "ok": false, "error": "Error: ...", "seconds": 0.001}
+
+What the run prints is not part of the reply; on failure its last line is the
+error. Requests are handled one at a time, in order, so a run sees the same
+random state a fresh process would.
+"""
+
+import contextlib
+import io
+import json
+import os
+import signal
+import socketserver
+import stat
+import sys
+import time
+
+def add_arguments(parser):
+    """Add --socket to an argparse parser"""
+    parser.add_argument('--socket', default=None, metavar='PATH',
+                        help='with --serve, take requests on this UNIX socket instead of stdin')
+
+def request_args(request):
+    """Command-line arguments of a request: its "args" list, or --name value for every other key but "id" """
+    if 'args' in request:
+        return [str(arg) for arg in request['args']]
+
+    args = []
+    for name, value in request.items():
+        if name == 'id' or value is None or value is False:
+            continue
+        args.append(f'--{name}')
+        if isinstance(value, list):
+            args.extend(str(item) for item in value)
+        elif value is not True:
+            args.append(str(value))
+    return args
+
+def handle_request(run, line):
+    """
+    Reply to one request line. run(args) carries out a run and returns its
+    output path, or exits or raises on failure; what it prints is captured.
+    """
+    start = time.perf_counter()
+    reply = {}
+    captured = io.StringIO()
+    try:
+        request = json.loads(line)
+        if not isinstance(request, dict):
+            raise ValueError('a request must be a JSON object')
+        if 'id' in request:
+            reply['id'] = request['id']
+
+        with contextlib.redirect_stdout(captured), contextlib.redirect_stderr(captured):
+            output = run(request_args(request))
+        reply.update(ok=True, output=output)
+    except SystemExit as e:
+        lines = captured.getvalue().strip().splitlines()
+        reply.update(ok=False, error=lines[-1] if lines else f"exited with status {e.code}")
+    except Exception as e:
+        reply.update(ok=False, error=f"{type(e).__name__}: {e}")
+    reply['seconds'] = time.perf_counter() - start
+    return json.dumps(reply)
+
+def serve_lines(run, lines, write):
+    """Handle every request line and write its reply as it is done"""
+    for line in lines:
+        if line.strip():
+            write(handle_request(run, line) + '\n')
+
+def serve(run, socket_path=None):
+    """Serve requests from stdin until it closes, or from a UNIX socket until interrupted or terminated"""
+    if socket_path is None:
+        # Replies are the only thing written to the real stdout
+        out = sys.stdout
+        def write(reply):
+            out.write(reply)
+            out.flush()
+        serve_lines(run, sys.stdin, write)
+        return
+
+    class Handler(socketserver.StreamRequestHandler):
+        def handle(self):
+            def write(reply):
+                self.wfile.write(reply.encode())
+                self.wfile.flush()
+            serve_lines(run, (line.decode() for line in self.rfile), write)
+
+    # A socket left behind by a server that is gone is replaced
+    if os.path.exists(socket_path) and stat.S_ISSOCK(os.stat(socket_path).st_mode):
+        os.unlink(socket_path)
+    signal.signal(signal.SIGTERM, lambda signum, frame: sys.exit(0))
+    with socketserver.UnixStreamServer(socket_path, Handler) as server:
+        print(f"Serving on {socket_path}", file=sys.stderr)
+        try:
+            server.serve_forever()
+        except KeyboardInterrupt:
+            pass
+        finally:
+            os.unlink(socket_path)
@@ -0,0 +1,190 @@
+#!/usr/bin/env python3
+
+"""
+Run a whole grid of selector.py compositions in one process.
+
+The grid is a JSON spec such as iso_sweep.json:
+
+    {
+        "num_tasks": 16,
+        "iso_tasks": 0,
+        "comb_tasks": {"range": [0, 13]},
+        "workload_tasks": "rest",
+        "seeds": {"range": [1, 100]},
+        "output": "./iso/{comb_tasks}/{seed_num}_{comb_tasks}-{comb_tasks}-combined.yaml"
+    }
+
+Every count is a number, a list of numbers or an inclusive {"range": [first,
+last]}, and the grid is every combination of them; "rest" gives the workload
+category the tasks left over by iso and comb tasks. The output template can
+use num_tasks, iso_tasks, comb_tasks, workload_tasks, light_tasks and seed_num.
+
+The pools are loaded once (per worker process) and every set is seeded with
+selector.selection_seed, so each output is byte-identical to the selector.py
+run with the same arguments. Outputs newer than the pools they were drawn
+from are skipped, so an interrupted sweep picks up where it stopped.
+
+With --schedule CPUS_A CPUS_B LOG every set of the grid is also scored by
+schedule.py's stand-in scheduler, and its result lines are written to LOG, a
+template over the same names as the output, one line per set in grid order.
+scrape.py and process.py read these logs like the real scheduler's.
+"""
+
+import argparse
+import itertools
+import json
+import sys
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+
+import instrument
+from pool import mode_table_path
+from schedule import schedule_files
+from selector import POOL_FILES, compose_task_set, load_mode_tables, load_pools, load_signature_indexes
+
+GRID_KEYS = ('num_tasks', 'iso_tasks', 'comb_tasks', 'workload_tasks', 'seeds')
+
+# Pools, mode tables, signature indexes and options of this process, set by load_state
+_state = {}
+
+def grid_values(spec, key):
+    """The values of one grid dimension of a spec"""
+    value = spec[key]
+    if isinstance(value, dict):
+        first, last = value['range']
+        return list(range(first, last + 1))
+    if isinstance(value, list):
+        return value
+    return [value]
+
+def template_fields(num_tasks, iso_tasks, comb_tasks, workload_tasks, seed_num):
+    """Names the output and log templates of a spec can use"""
+    return dict(num_tasks=num_tasks, iso_tasks=iso_tasks, comb_tasks=comb_tasks, workload_tasks=workload_tasks,
+                light_tasks=num_tasks - iso_tasks - comb_tasks - workload_tasks, seed_num=seed_num)
+
+def expand_grid(spec):
+    """
+    Every composition of a spec as (num_tasks, iso_tasks, comb_tasks,
+    workload_tasks, seed_num, output) in the order gen.sh ran them: seeds
+    innermost. Compositions that ask for more tasks than num_tasks are
+    reported and left out.
+    """
+    rest = spec['workload_tasks'] == 'rest'
+    grid = [grid_values(spec, key) if not (key == 'workload_tasks' and rest) else [None] for key in GRID_KEYS]
+
+    compositions = []
+    for num_tasks, iso_tasks, comb_tasks, workload_tasks, seed_num in itertools.product(*grid):
+        if rest:
+            workload_tasks = num_tasks - iso_tasks - comb_tasks
+        light_tasks = num_tasks - iso_tasks - comb_tasks - workload_tasks
+        if workload_tasks < 0 or light_tasks < 0:
+            print(f"Warning: skipping {iso_tasks} iso, {comb_tasks} comb and {workload_tasks} workload tasks, more than {num_tasks}")
+            continue
+
+        output = spec['output'].format(**template_fields(num_tasks, iso_tasks, comb_tasks, workload_tasks, seed_num))
+        compositions.append((num_tasks, iso_tasks, comb_tasks, workload_tasks, seed_num, output))
+    return compositions
+
+def pool_mtime(binary=False):
+    """Newest modification time of the pool files (and their mode tables) a sweep reads"""
+    paths = set()
+    for file_path in POOL_FILES.values():
+        paths.add(Path(file_path).with_suffix('.pool') if binary else Path(file_path))
+        paths.add(mode_table_path(file_path))
+    return max((path.stat().st_mtime for path in paths if path.exists()), default=0)
+
+def is_up_to_date(output, since):
+    """Whether output exists and was written after time since"""
+    try:
+        return Path(output).stat().st_mtime >= since
+    except FileNotFoundError:
+        return False
+
+def load_state(binary=False, distinct=False, prescreen=None, max_resamples=100):
+    """Load the pools and everything derived from them, once per process"""
+    _state['pools'] = load_pools(binary)
+    _state['mode_tables'] = load_mode_tables(_state['pools'])
+    _state['signature_indexes'] = load_signature_indexes(_state['pools']) if distinct else None
+    _state['prescreen'] = prescreen
+    _state['max_resamples'] = max_resamples
+
+def compose(composition):
+    """Write one composition the way selector.py would; returns its output and None, or an error message"""
+    num_tasks, iso_tasks, comb_tasks, workload_tasks, seed_num, output = composition
+    return output, compose_task_set(_state['pools'], _state['mode_tables'], num_tasks, iso_tasks, comb_tasks, workload_tasks, seed_num,
+                                    output, _state['prescreen'], _state['max_resamples'], _state['signature_indexes'])
+
+def run_sweep(compositions, workers=None, state=(), timings=instrument.NULL_TIMINGS):
+    """
+    Compose every set across workers processes (1 composes in this process)
+    and return the errors as (output, message) pairs, in grid order.
+    """
+    errors = []
+    with timings.stage('compose'):
+        if workers == 1:
+            load_state(*state)
+            results = map(compose, compositions)
+            errors = [(output, error) for output, error in results if error is not None]
+        else:
+            with ProcessPoolExecutor(max_workers=workers, initializer=load_state, initargs=state) as executor:
+                results = executor.map(compose, compositions, chunksize=16)
+                errors = [(output, error) for output, error in results if error is not None]
+    timings.count('compose', len(compositions), 'sets')
+    return errors
+
+def write_schedule_logs(compositions, log_template, cpus_a, cpus_b, workers=None, timings=instrument.NULL_TIMINGS):
+    """Score every composed set and write the result lines to the logs log_template names, in grid order"""
+    with timings.stage('schedule'):
+        lines = schedule_files([composition[-1] for composition in compositions], cpus_a, cpus_b, workers)
+    timings.count('schedule', len(lines), 'sets')
+
+    logs = {}
+    for composition, line in zip(compositions, lines):
+        logs.setdefault(log_template.format(**template_fields(*composition[:5])), []).append(line + '\n')
+    for log, log_lines in logs.items():
+        Path(log).parent.mkdir(parents=True, exist_ok=True)
+        with open(log, 'w') as f:
+            f.write(''.join(log_lines))
+    return list(logs)
+
+def main():
+    parser = argparse.ArgumentParser(description='Compose a grid of task sets from the 3000s/ pools in one process.')
+    parser.add_argument('spec', help='JSON grid spec (see sweep.py)')
+    parser.add_argument('-j', '--workers', type=int, default=None, help='number of worker processes (default: one per CPU, 1 for none)')
+    parser.add_argument('--force', action='store_true', help='write every output, even those that are up to date')
+    parser.add_argument('--binary', action='store_true', help='read the memory-mapped .pool files instead of the YAML pools')
+    parser.add_argument('--prescreen', type=int, nargs=2, metavar=('CPUS_A', 'CPUS_B'), default=None,
+                        help='resample task sets that cannot fit on this many type A and type B CPUs')
+    parser.add_argument('--max_resamples', type=int, default=100, help='give up after this many infeasible sets when pre-screening')
+    parser.add_argument('--distinct', action='store_true', help='never put two tasks with the same signature into a set')
+    parser.add_argument('--schedule', nargs=3, metavar=('CPUS_A', 'CPUS_B', 'LOG'), default=None,
+                        help='score every set with schedule.py on CPUS_A type A and CPUS_B type B CPUs and write the '
+                             'result lines to LOG, a template like the output')
+    instrument.add_arguments(parser)
+
+    args = parser.parse_args()
+    timings = instrument.start('sweep.py', args.profile, args.timings)
+
+    with open(args.spec, 'r') as f:
+        compositions = expand_grid(json.load(f))
+
+    since = pool_mtime(args.binary)
+    pending = compositions if args.force else [c for c in compositions if not is_up_to_date(c[-1], since)]
+    skipped = len(compositions) - len(pending)
+
+    errors = run_sweep(pending, args.workers, (args.binary, args.distinct, args.prescreen, args.max_resamples), timings) if pending else []
+    for output, error in errors:
+        print(f"Error: {output}: {error}")
+
+    print(f"Wrote {len(pending) - len(errors)} task sets, skipped {skipped} up to date, {len(errors)} failed")
+
+    if args.schedule:
+        failed = {output for output, _ in errors}
+        written = [c for c in compositions if c[-1] not in failed]
+        logs = write_schedule_logs(written, args.schedule[2], int(args.schedule[0]), int(args.schedule[1]), args.workers, timings)
+        print(f"Scored {len(written)} task sets into {len(logs)} log(s)")
+    if errors:
+        sys.exit(1)
+
+if __name__ == "__main__":
+    main()